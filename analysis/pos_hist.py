@@ -1,17 +1,14 @@
 import os
-from collections import Counter
 
-import spacy
+from cyber.util.pos_store import annotate_file
 
 DATA_DIR = "data"
 DATA_FILES = [os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.endswith(".txt")]
 
-nlp = spacy.load("en")
 all_pos = set()
 hists = {}
 for data_file in DATA_FILES:
-    with open(data_file, encoding="utf-8") as f:
-        pos_hist = Counter(token.pos_ for doc in nlp.pipe(f) for token in doc)
+    pos_hist = annotate_file(data_file).pos_histogram()  # tagged only on first run
     all_pos.update(pos_hist)
     hists[data_file] = pos_hist
 
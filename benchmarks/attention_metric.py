@@ -0,0 +1,77 @@
+"""
+Compare the per-batch overhead of the vectorized ``AttentionMetric`` with the former per-token Python loop.
+
+Usage: python -m benchmarks.attention_metric [--batch-size 32] [--num-tokens 300] [--vocab-size 20000]
+"""
+import argparse
+import time
+from collections import Counter, defaultdict
+
+import torch
+from allennlp.data import Vocabulary
+
+from cyber.metrics.attention import AttentionMetric
+
+
+class LoopAttentionMetric:
+    """The former implementation, keyed by "label\\ttoken" strings and updated token by token."""
+
+    def __init__(self):
+        self._cumulative_attention = defaultdict(float)
+        self._occurrences = Counter()
+
+    def __call__(self, tokens, self_weights, labels, mask):
+        weights = self_weights * self_weights.eq(0).eq(0).sum(1).unsqueeze(1).type(torch.FloatTensor)
+        for instance_tokens, instance_weights, label, instance_mask in zip(tokens, weights, labels, mask):
+            for token, weight, token_mask in zip(instance_tokens, instance_weights, instance_mask):
+                if token_mask:
+                    key = "\t".join((label, token))
+                    self._cumulative_attention[key] += weight.item()
+                    self._occurrences[key] += 1
+
+
+def random_batch(vocab, batch_size, num_tokens, device):
+    vocab_size = vocab.get_vocab_size("tokens")
+    token_ids = torch.randint(2, vocab_size, (batch_size, num_tokens), device=device)
+    lengths = torch.randint(1, num_tokens + 1, (batch_size, 1), device=device)
+    mask = (torch.arange(num_tokens, device=device).unsqueeze(0) < lengths).float()
+    logits = torch.randn(batch_size, num_tokens, device=device)
+    self_weights = torch.softmax(logits * mask - 1e7 * (1 - mask), dim=-1) * mask
+    labels = torch.randint(0, 2, (batch_size,), device=device)
+    return token_ids * mask.long(), self_weights, labels, mask
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-tokens", type=int, default=300)
+    argparser.add_argument("--vocab-size", type=int, default=20000)
+    argparser.add_argument("--num-batches", type=int, default=20)
+    argparser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = argparser.parse_args()
+    vocab = Vocabulary()
+    vocab.add_tokens_to_namespace(["token%d" % i for i in range(args.vocab_size - 2)], "tokens")
+    vocab.add_tokens_to_namespace(["legal", "illegal"], "labels")
+    batches = [random_batch(vocab, args.batch_size, args.num_tokens, args.device) for _ in range(args.num_batches)]
+    vectorized, loop = AttentionMetric(vocab), LoopAttentionMetric()
+    start = time.perf_counter()
+    for token_ids, self_weights, labels, mask in batches:
+        vectorized(token_ids, self_weights, labels, mask)
+    if args.device != "cpu":
+        torch.cuda.synchronize()
+    vectorized_time = (time.perf_counter() - start) / args.num_batches
+    strings = [([[vocab.get_token_from_index(i) for i in instance] for instance in token_ids.tolist()],
+                [vocab.get_token_from_index(i, "labels") for i in labels.tolist()]) for token_ids, _, labels, _ in
+               batches]
+    start = time.perf_counter()
+    for (tokens, labels), (_, self_weights, _, mask) in zip(strings, batches):
+        loop(tokens, self_weights.cpu(), labels, mask.cpu())
+    loop_time = (time.perf_counter() - start) / args.num_batches
+    assert len(loop._occurrences) == vectorized._occurrences.nonzero().numel(), "Different number of keys"
+    print("method", "ms per batch", sep="\t")
+    print("loop", "%.2f" % (1000 * loop_time), sep="\t")
+    print("vectorized", "%.2f" % (1000 * vectorized_time), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare peak memory and wall time of the dense one-hot bag-of-words featurization formerly used by the
+sklearn models with the sparse ``bag_of_words`` featurizer.
+
+Usage: python -m benchmarks.bag_of_words [--batch-size 32] [--num-tokens 300] [--vocab-size 20000]
+
+Every method runs in a fresh process, so the reported peak RSS is not shared between them.
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from cyber.models.bag_of_words import bag_of_words
+
+
+def dense(tokens, mask, vocab_size):
+    return np.eye(vocab_size + 1, dtype=int)[mask * (tokens + 1)].sum(1)[:, 1:]
+
+
+def sparse(tokens, mask, vocab_size):
+    return bag_of_words(tokens, mask, vocab_size)
+
+
+METHODS = {"dense": dense, "sparse": sparse}
+
+
+def random_batch(batch_size, num_tokens, vocab_size):
+    rng = np.random.RandomState(0)
+    tokens = rng.randint(2, vocab_size, size=(batch_size, num_tokens))
+    lengths = rng.randint(1, num_tokens + 1, size=batch_size)
+    mask = (np.arange(num_tokens) < lengths[:, None]).astype(int)
+    return tokens * mask, mask
+
+
+def run(method, batch_size, num_tokens, vocab_size):
+    tokens, mask = random_batch(batch_size, num_tokens, vocab_size)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    bow = METHODS[method](tokens, mask, vocab_size)
+    duration = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return duration, before / 1024, peak / 1024, int(bow.sum())
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-tokens", type=int, default=300)
+    argparser.add_argument("--vocab-size", type=int, default=20000)
+    argparser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    args = argparser.parse_args()
+    context = multiprocessing.get_context("spawn")
+    print("method", "seconds", "base RSS (MB)", "peak RSS (MB)", "total count", sep="\t")
+    for method in args.methods:
+        with context.Pool(1) as pool:
+            duration, base, peak, total = pool.apply(run, (method, args.batch_size, args.num_tokens,
+                                                           args.vocab_size))
+        print(method, "%.3f" % duration, "%.1f" % base, "%.1f" % peak, total, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare the peak memory and time of the full biattention of ``AttentionClassifier`` with
+``blockwise_self_attention``, for a forward and backward pass over random encodings of increasing length, and the
+largest difference between their outputs and gradients.
+
+Usage: python -m benchmarks.blockwise_attention [--lengths 256 512 1024 2048] [--batch-size 8] [--dim 600]
+           [--block-size 128]
+
+Each measurement runs in a new process, and the peak memory is the growth of its maximum resident set size.
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+import torch
+from allennlp.nn import util
+
+from cyber.modules.blockwise_attention import blockwise_self_attention
+
+
+def full_self_attention(encoded_tokens, mask):
+    attention_weights = util.masked_softmax(encoded_tokens.bmm(encoded_tokens.permute(0, 2, 1).contiguous()), mask)
+    return util.weighted_sum(encoded_tokens, attention_weights)
+
+
+def measure(length, batch_size, dim, block_size):
+    torch.manual_seed(length)
+    encoded_tokens = torch.randn(batch_size, length, dim, requires_grad=True)
+    mask = torch.ones(batch_size, length)
+    mask[1:, length // 2:] = 0  # half of each document but the first is padding
+    gradient = torch.randn(batch_size, length, dim)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if block_size:
+        encoded_text = blockwise_self_attention(encoded_tokens, mask, block_size)
+    else:
+        encoded_text = full_self_attention(encoded_tokens, mask)
+    encoded_text.backward(gradient)
+    seconds = time.perf_counter() - start
+    peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+    return seconds, peak_mb, encoded_text.detach(), encoded_tokens.grad
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--lengths", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    argparser.add_argument("--batch-size", type=int, default=8)
+    argparser.add_argument("--dim", type=int, default=600, help="encoder output dim")
+    argparser.add_argument("--block-size", type=int, default=128)
+    args = argparser.parse_args()
+    context = multiprocessing.get_context("fork")
+    print("length", "full MB", "blockwise MB", "full sec", "blockwise sec", "max difference", sep="\t")
+    for length in args.lengths:
+        results = []
+        for block_size in None, args.block_size:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(measure, (length, args.batch_size, args.dim, block_size)))
+        (full_seconds, full_mb, full_output, full_grad), (seconds, mb, output, grad) = results
+        difference = max(float((output - full_output).abs().max()), float((grad - full_grad).abs().max()))
+        print(length, "%.0f" % full_mb, "%.0f" % mb, "%.3f" % full_seconds, "%.3f" % seconds, "%.2g" % difference,
+              sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Check that ``clean_text.clean`` gives byte-identical output to the former implementation, which applied
+every pattern and word with a separate ``re.sub``/``str.replace``, and compare their speed in lines/sec.
+
+Usage: python -m benchmarks.clean_text [FILE_OR_DIR ...] [--num-random-lines 100000]
+
+Sample lines are read from the given raw document files (or all files in the given directories), plus
+randomly generated lines: half of them plain text, half built from the fragments that the patterns target.
+Exits with an error on the first line whose output differs.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from unidecode import unidecode
+
+from cyber.util.clean_text import clean, read_file, DELETE_ROW_PATTERNS, DELETE_PATTERN1, DELETE_WORD1, \
+    DELETE_PATTERN_IGNORECASE, DELETE_PATTERN2, DELETE_WORD2, DELETE_PATTERN3
+
+
+def legacy_clean(text):
+    for pattern in DELETE_ROW_PATTERNS:
+        if re.search(pattern, text):
+            return ""
+    for pattern in DELETE_PATTERN1:
+        text = re.sub(pattern, ' ', text)
+    for word in DELETE_WORD1:
+        text = text.replace(word, ' ')
+    for pattern in DELETE_PATTERN_IGNORECASE:
+        text = re.sub(pattern, ' ', text, flags=re.IGNORECASE)
+    for pattern in DELETE_PATTERN2:
+        text = re.sub(pattern, ' ', text)
+    for word in DELETE_WORD2:
+        text = text.replace(word, ' ')
+    for pattern in DELETE_PATTERN3:
+        text = re.sub(pattern, ' ', text)
+    text = re.sub(r'[\s=]+', ' ', text)
+    text = re.sub(r'--+', '--', text)
+    text = re.sub(r'(\.\s*\.)+', '..', text)
+    return text.strip()
+
+
+FRAGMENTS = (
+    "http://", "https://", "ftp:/", "file:", "www.example.onion/page", "a.jpg", ".png", ".JPG", ".html", "d=", "fbid=",
+    "(12 points)", "xcxbb", "xexac", "xex", "xbb", "xac", "x", "c", "e", "a", "b", "//", "/", "[", "]", "*", "#", "\\",
+    "(BUTTON)", "BUTTON", "Buy Now", "buy now", "add to cart", "To Cart", "comments feed", "1_ X", "1_", "X",
+    "javascript:void(0)", "Input", "(not", "implemented)", "_", "~", "+", "xb1ol", "0 item(s)", "0", "item(s)",
+    "13abJg9Rc2uRgWN7NLRmeM5Q1jkh7wfcMh", "c607a2f21680e3777808d3f320e551ab", "Powered by", "byyy", ".onion",
+    "File:", "./ucp", "./ucpS", "=", "==", "-", "--", "---", ".", ". .", "...", " ", "  ", "\t", "\x0b", "\x1c",
+    "\xa0", "\u2028", "GMT", "12345", "1234567", "View the latest post", "asked 3 days ago in 12", "PGP SIGNATURE",
+    "the", "pills", "forum", "legal",
+)
+
+
+# Most real lines contain none of the patterns
+WORDS = ("the", "pills", "forum", "legal", "shipping", "quality", "vendor", "reply", "Posted", "2019,", "price:",
+         "$12.50", "(free)", "I", "have", "been", "ordering", "from", "this", "shop", "for", "years.")
+
+
+def random_lines(num_lines, seed=0):
+    rng = random.Random(seed)
+    for i in range(num_lines):
+        if i % 2:
+            yield " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30)))
+        else:
+            yield "".join(rng.choice(FRAGMENTS) + rng.choice(("", "", " ")) for _ in range(rng.randint(1, 30)))
+
+
+def file_lines(paths):
+    for path in paths:
+        filenames = [os.path.join(path, f) for f in os.listdir(path)] if os.path.isdir(path) else [path]
+        for filename in filenames:
+            for line in read_file(filename):
+                yield unidecode(line)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("paths", nargs="*", help="raw document files or directories to take sample lines from")
+    argparser.add_argument("--num-random-lines", type=int, default=100000)
+    args = argparser.parse_args()
+    lines = list(file_lines(args.paths)) + list(random_lines(args.num_random_lines))
+    for line in lines:
+        expected, actual = legacy_clean(line), clean(line)
+        if expected != actual:
+            sys.exit("Output differs for %r:\n%r (before)\n%r (now)" % (line, expected, actual))
+    print("Identical output on %d lines" % len(lines))
+    print("implementation", "lines/sec", sep="\t")
+    for name, func in ("before", legacy_clean), ("now", clean):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        print(name, "%.0f" % (len(lines) / (time.perf_counter() - start)), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
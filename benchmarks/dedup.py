@@ -0,0 +1,74 @@
+"""
+Check that ``dedup.Deduplicator`` finds the same duplicates whether its hashes are kept in memory or spilled to an
+SQLite database, and when run again on the same database (as a rerun of ``split_data.py --spill-dir`` does), and
+compare their speed in lines/sec.
+
+Usage: python -m benchmarks.dedup [FILE ...] [--num-random-lines 100000] [--threshold T]
+
+Sample lines are read from the given files, plus randomly generated lines, a third of which repeat an earlier
+line. Exits with an error if any run flags different lines as duplicates.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from cyber.util.dedup import Deduplicator
+
+
+def random_lines(n, seed=0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 8)))
+             for _ in range(2000)]
+    lines = []
+    for _ in range(n):
+        if lines and rng.random() < 1 / 3:
+            lines.append(rng.choice(lines))
+        else:
+            lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(3, 30))))
+    return lines
+
+
+def run(lines, threshold, path):
+    """
+    Returns the duplicate flags of the lines and the seconds it took to compute them.
+    """
+    dedup = Deduplicator(threshold, path=path)
+    start = time.perf_counter()
+    flags = [dedup.is_duplicate(line) for line in lines]
+    seconds = time.perf_counter() - start
+    dedup.close()
+    return flags, seconds
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_paths", nargs="*")
+    argparser.add_argument("--num-random-lines", type=int, default=100000)
+    argparser.add_argument("--threshold", type=float, help="near-duplicate Jaccard threshold (default: exact)")
+    args = argparser.parse_args()
+    lines = random_lines(args.num_random_lines)
+    for file_path in args.file_paths:
+        with open(file_path, encoding="utf-8") as f:
+            lines += [line.rstrip("\n") for line in f]
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        path = os.path.join(spill_dir, "hashes.sqlite")
+        results = {"memory": run(lines, args.threshold, None),
+                   "spill": run(lines, args.threshold, path),
+                   "spill rerun": run(lines, args.threshold, path)}
+    expected, _ = results["memory"]
+    print("store", "duplicates", "lines/sec", sep="\t")
+    for name, (flags, seconds) in results.items():
+        print(name, sum(flags), "%.0f" % (len(lines) / seconds), sep="\t")
+    for name, (flags, _) in results.items():
+        if flags != expected:
+            sys.exit("%s: %d lines flagged differently than in memory" % (
+                name, sum(a != b for a, b in zip(flags, expected))))
+    print("All %d runs agree on %d lines" % (len(results), len(lines)))
+
+
+if __name__ == "__main__":
+    main()
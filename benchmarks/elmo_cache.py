@@ -0,0 +1,61 @@
+"""
+Compare the time per epoch of computing ELMo representations with ``Elmo`` and with an ``ElmoActivationCache``,
+in its first epoch (running the biLM and filling the cache) and in later ones (reading it), and the largest
+difference between the representations.
+
+Usage: python -m benchmarks.elmo_cache [FILE ...] [--config CONFIG.json] [--num-documents 1000] [--batch-size 32]
+
+By default, documents are read from all files in ``data/train``, and ELMo is configured as in
+``experiments/onion_forums_legal_vs_illegal/elmoattention.json``. The cache is written to a temporary directory.
+"""
+import argparse
+import glob
+import tempfile
+import time
+from itertools import islice
+
+import torch
+from allennlp.common import Params
+from allennlp.data import Vocabulary
+from allennlp.data.iterators import BasicIterator
+from allennlp.data.token_indexers import ELMoTokenCharactersIndexer
+from allennlp.modules import Elmo
+
+from cyber.dataset_readers import DocumentDatasetReader
+from cyber.modules.elmo_cache import ElmoActivationCache
+
+
+def epoch(embed, batches):
+    start = time.perf_counter()
+    with torch.no_grad():
+        representations = [embed(batch["text"]["elmo"])["elmo_representations"][0] for batch in batches]
+    return time.perf_counter() - start, representations
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_paths", nargs="*", default=sorted(glob.glob("data/train/*.txt")))
+    argparser.add_argument("--config", default="experiments/onion_forums_legal_vs_illegal/elmoattention.json")
+    argparser.add_argument("--num-documents", type=int, default=1000)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    args = argparser.parse_args()
+    reader = DocumentDatasetReader(token_indexers={"elmo": ELMoTokenCharactersIndexer()})
+    instances = list(islice(reader.read(args.file_paths), args.num_documents))
+    iterator = BasicIterator(batch_size=args.batch_size)
+    iterator.index_with(Vocabulary())
+    batches = list(iterator(instances, num_epochs=1, shuffle=False))
+    elmo = Elmo.from_params(Params.from_file(args.config)["model"]["elmo"])
+    elmo.eval()
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = ElmoActivationCache(cache_directory)
+        print("epoch", "seconds", "max difference", sep="\t")
+        seconds, expected = epoch(elmo, batches)
+        print("no cache", "%.2f" % seconds, "", sep="\t")
+        for name in "cold cache", "warm cache":
+            seconds, representations = epoch(lambda inputs: cache(elmo, inputs), batches)
+            print(name, "%.2f" % seconds, "%.4f" % max(float((r - e).abs().max())
+                                                      for r, e in zip(representations, expected)), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare serving a model from its archive, as ``server.sh`` does (AllenNLP, ``cyber`` and a ``Predictor``, here
+with attention outputs off), with serving it from the output of ``cyber.predictors.export`` with
+``serving.runtime``: the startup time (from a new Python process to a loaded model), and the latency per document
+and per batch. The predicted labels are checked to agree.
+
+Usage: python -m benchmarks.exported_model MODEL.tar.gz EXPORT_DIR [FILE] [--batch-size 32] [--num-batches 20]
+
+By default, documents are read from the first file in ``data/test``.
+"""
+import argparse
+import glob
+import subprocess
+import sys
+import time
+from itertools import islice
+
+LOAD_ARCHIVE = """
+from allennlp.common.util import import_submodules
+from cyber.predictors.bulk_classify import load_predictor
+import_submodules("cyber")
+load_predictor(%r)
+"""
+
+LOAD_EXPORT = """
+from serving.runtime import ExportedClassifier
+ExportedClassifier(%r)
+"""
+
+
+def startup_seconds(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def latencies_ms(predict_batch, texts, batch_size):
+    """
+    Returns the labels, and the mean milliseconds per document predicted alone and per batch.
+    """
+    predict_batch(texts[:batch_size])  # warm up
+    start = time.perf_counter()
+    for text in texts[:batch_size]:
+        predict_batch([text])
+    per_document = (time.perf_counter() - start) / batch_size
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    start = time.perf_counter()
+    labels = [output["label"] for batch in batches for output in predict_batch(batch)]
+    per_batch = (time.perf_counter() - start) / len(batches)
+    return labels, 1000 * per_document, 1000 * per_batch
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("export_dir")
+    argparser.add_argument("file_path", nargs="?", default=next(iter(sorted(glob.glob("data/test/*.txt"))), None))
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-batches", type=int, default=20)
+    args = argparser.parse_args()
+    with open(args.file_path, encoding="utf-8") as f:
+        texts = [line.strip() for line in islice(f, args.batch_size * args.num_batches)]
+
+    archive_startup = startup_seconds(LOAD_ARCHIVE % args.archive_path)
+    export_startup = startup_seconds(LOAD_EXPORT % args.export_dir)
+
+    from allennlp.common.util import import_submodules
+    from cyber.predictors.bulk_classify import load_predictor
+    from serving.runtime import ExportedClassifier
+    import_submodules("cyber")
+    predictor, reader, _ = load_predictor(args.archive_path)
+    expected, archive_document_ms, archive_batch_ms = latencies_ms(
+        lambda batch: predictor.predict_batch_instance([reader.text_to_instance(text) for text in batch]),
+        texts, args.batch_size)
+    labels, export_document_ms, export_batch_ms = latencies_ms(ExportedClassifier(args.export_dir).predict_batch,
+                                                               texts, args.batch_size)
+    agreement = sum(label == expected_label for label, expected_label in zip(labels, expected)) / len(labels)
+
+    print("model", "startup sec", "ms per document", "ms per batch", sep="\t")
+    print("archive", "%.2f" % archive_startup, "%.1f" % archive_document_ms, "%.1f" % archive_batch_ms, sep="\t")
+    print("export", "%.2f" % export_startup, "%.1f" % export_document_ms, "%.1f" % export_batch_ms, sep="\t")
+    print("Label agreement: %.2f%%" % (100 * agreement))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare the ``attention_classifier`` predictor with ``attention_classifier_light``, which skips the attention
+outputs and metric, by the size of the JSON output and the prediction latency per batch.
+
+Usage: python -m benchmarks.light_prediction MODEL.tar.gz [FILE] [--batch-size 32] [--num-batches 20]
+
+By default, documents are read from the first file in ``data/test``. The predicted labels are checked to agree.
+"""
+import argparse
+import glob
+import json
+import time
+from itertools import islice
+
+from allennlp.common.util import import_submodules
+from allennlp.models.archival import load_archive
+from allennlp.predictors.predictor import Predictor
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("file_path", nargs="?", default=next(iter(sorted(glob.glob("data/test/*.txt"))), None))
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-batches", type=int, default=20)
+    argparser.add_argument("--cuda-device", type=int, default=-1)
+    args = argparser.parse_args()
+    import_submodules("cyber")
+    with open(args.file_path, encoding="utf-8") as f:
+        inputs = [{"text_input": line.strip()} for line in islice(f, args.batch_size * args.num_batches)]
+    batches = [inputs[i:i + args.batch_size] for i in range(0, len(inputs), args.batch_size)]
+    expected = None
+    print("predictor", "ms per batch", "KB per document", sep="\t")
+    for name in "attention_classifier", "attention_classifier_light":
+        # Load the archive again, since the light predictor changes the model
+        predictor = Predictor.from_archive(load_archive(args.archive_path, cuda_device=args.cuda_device), name)
+        predictor.predict_batch_json(batches[0])  # warm up
+        start = time.perf_counter()
+        outputs = [output for batch in batches for output in predictor.predict_batch_json(batch)]
+        seconds = time.perf_counter() - start
+        labels = [output["label"] for output in outputs]
+        if expected is None:
+            expected = labels
+        assert labels == expected, "Different labels: " + name
+        print(name, "%.1f" % (1000 * seconds / len(batches)),
+              "%.2f" % (len(json.dumps(outputs)) / len(outputs) / 1000), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the pooling of ``AttentionClassifier`` as it was (with a masked copy of the encodings each for the max and
+the min) with ``MaskedPooling``, run eagerly and compiled with ``torch.jit.script``, by the memory allocated and
+the time per batch on CPU, for a forward and backward pass over random encodings.
+
+Usage: python -m benchmarks.masked_pooling [--batch-size 32] [--num-tokens 400] [--dim 600] [--repeat 20]
+
+The default dimension is that of the integrator output of the ``attention`` experiments.
+"""
+import argparse
+import time
+
+import torch
+from allennlp.nn import util
+
+from cyber.modules.masked_pooling import MaskedPooling
+
+
+def separate_pooling(encodings, mask, attention_logits):
+    max_pool = torch.max(util.replace_masked_values(encodings, mask.unsqueeze(2), -1e7), 1)[0]
+    min_pool = torch.min(util.replace_masked_values(encodings, mask.unsqueeze(2), +1e7), 1)[0]
+    mean_pool = torch.sum(encodings, 1) / torch.sum(mask, 1, keepdim=True)
+    self_weights = util.masked_softmax(attention_logits, mask)
+    self_attentive_pool = util.weighted_sum(encodings, self_weights)
+    return torch.cat([max_pool, min_pool, mean_pool, self_attentive_pool], 1), self_weights
+
+
+def run(pooling, encodings, mask, attention_logits, gradient):
+    pooled, _ = pooling(encodings, mask, attention_logits)
+    pooled.backward(gradient)
+
+
+def allocated_mb(pooling, *inputs):
+    with torch.autograd.profiler.profile(profile_memory=True) as profile:
+        run(pooling, *inputs)
+    return sum(max(event.self_cpu_memory_usage, 0) for event in profile.function_events) / 2 ** 20
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-tokens", type=int, default=400)
+    argparser.add_argument("--dim", type=int, default=600)
+    argparser.add_argument("--repeat", type=int, default=20)
+    args = argparser.parse_args()
+    torch.manual_seed(0)
+    mask = (torch.arange(args.num_tokens).unsqueeze(0) <
+            torch.randint(1, args.num_tokens + 1, (args.batch_size, 1))).float()
+    encodings = (torch.randn(args.batch_size, args.num_tokens, args.dim) * mask.unsqueeze(2)).requires_grad_()
+    attention_logits = torch.randn(args.batch_size, args.num_tokens, requires_grad=True)
+    gradient = torch.randn(args.batch_size, 4 * args.dim)
+    inputs = encodings, mask, attention_logits, gradient
+    expected, _ = separate_pooling(encodings, mask, attention_logits)
+    print("pooling", "MB allocated", "ms per batch", "max difference", sep="\t")
+    for name, pooling in ("separate", separate_pooling), ("MaskedPooling", MaskedPooling()), \
+                         ("MaskedPooling (TorchScript)", torch.jit.script(MaskedPooling())):
+        run(pooling, *inputs)  # warm up
+        mb = allocated_mb(pooling, *inputs)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run(pooling, *inputs)
+        seconds = (time.perf_counter() - start) / args.repeat
+        difference = float((pooling(encodings, mask, attention_logits)[0] - expected).abs().max())
+        print(name, "%.1f" % mb, "%.1f" % (1000 * seconds), "%.2g" % difference, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
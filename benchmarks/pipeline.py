@@ -0,0 +1,64 @@
+"""
+Compare classifying a directory of raw pages in two steps (``clean_directory`` writing ``_clean`` files, then
+predicting on those files) with the streaming ``cyber.predictors.pipeline``, by wall time and documents/sec.
+
+Usage: python -m benchmarks.pipeline MODEL.tar.gz RAW_DIR [--batch-size 64] [--cuda-device -1]
+
+Duplicate filtering is off in both, and their labels are checked to agree. The ``_clean`` directory written by
+the two-step flow is removed afterwards.
+"""
+import argparse
+import shutil
+import time
+from itertools import islice
+
+from allennlp.common.util import import_submodules
+
+from cyber.predictors.bulk_classify import list_files, load_predictor
+from cyber.predictors.pipeline import classify_pages
+from cyber.util.clean_text import clean_directory
+
+
+def two_step(raw_dir, predictor, reader, batch_size):
+    clean_directory(raw_dir, progress=False)
+    try:
+        texts = (line.strip() for file_path in list_files([raw_dir + "_clean"])
+                 for line in open(file_path, encoding="utf-8"))
+        labels = []
+        for batch in iter(lambda: list(islice(texts, batch_size)), []):
+            instances = [reader.text_to_instance(text) for text in batch if text]
+            labels += [output.get("label") for output in predictor.predict_batch_instance(instances)]
+        return labels
+    finally:
+        shutil.rmtree(raw_dir + "_clean")
+
+
+def streaming(raw_dir, predictor, reader, batch_size):
+    return [output.get("label") for _, output in classify_pages(list_files([raw_dir]), predictor, reader,
+                                                                 batch_size=batch_size)]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("raw_dir")
+    argparser.add_argument("--batch-size", type=int, default=64)
+    argparser.add_argument("--cuda-device", type=int, default=-1)
+    args = argparser.parse_args()
+    import_submodules("cyber")
+    predictor, reader, _ = load_predictor(args.archive_path, args.cuda_device)
+    raw_dir = args.raw_dir.rstrip("/")
+    expected = None
+    print("flow", "seconds", "documents/sec", sep="\t")
+    for name, func in ("two-step", two_step), ("streaming", streaming):
+        start = time.perf_counter()
+        labels = func(raw_dir, predictor, reader, args.batch_size)
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = labels
+        assert labels == expected, "Different labels: " + name
+        print(name, "%.2f" % seconds, "%.1f" % (len(labels) / seconds), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
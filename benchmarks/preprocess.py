@@ -0,0 +1,70 @@
+"""
+Compare the throughput (documents/sec) of POS masking in ``preprocess.py``: the former implementation (full spaCy
+pipeline, ``mask`` called for every token in each of the five variants) against ``mask_lines`` (parser and NER
+disabled, one pass per document) on one process and on several.
+
+Usage: python -m benchmarks.preprocess [FILE] [--num-documents 5000] [--processes 4]
+
+By default, documents are read from the first file in ``data/train``. The outputs are checked to be identical.
+"""
+import argparse
+import glob
+import os
+import time
+from functools import partial
+from itertools import islice
+
+import spacy
+
+from cyber.util.clean_text import map_files
+from cyber.util.pos_store import chunks, get_nlp
+from cyber.util.preprocess import VARIANTS, mask, mask_lines
+
+
+def legacy_mask_lines(nlp, lines):
+    results = []
+    for doc in nlp.pipe(lines):
+        variants = []
+        for _, kwargs in VARIANTS:
+            s = "".join(mask(t, **kwargs) for t in doc)
+            variants.append(" ".join(s.split()).strip() if s else None)
+        results.append(variants)
+    return results
+
+
+def parallel_mask_lines(lines, processes, batch_size):
+    return [variants for chunk in map_files(partial(mask_lines, batch_size=batch_size), chunks(lines, batch_size),
+                                            processes) for variants in chunk]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_path", nargs="?", default=next(iter(sorted(glob.glob("data/train/*.txt"))), None))
+    argparser.add_argument("--num-documents", type=int, default=5000)
+    argparser.add_argument("--processes", type=int, default=os.cpu_count())
+    argparser.add_argument("--batch-size", type=int, default=1000)
+    args = argparser.parse_args()
+    with open(args.file_path, encoding="utf-8") as f:
+        lines = [line.strip() for line in islice(f, args.num_documents)]
+    full_nlp = spacy.load("en")
+    get_nlp()
+    methods = (
+        ("before", partial(legacy_mask_lines, full_nlp)),
+        ("now, 1 process", partial(mask_lines, batch_size=args.batch_size)),
+        ("now, %d processes" % args.processes, partial(parallel_mask_lines, processes=args.processes,
+                                                       batch_size=args.batch_size)),
+    )
+    expected = None
+    print("method", "documents/sec", sep="\t")
+    for name, func in methods:
+        start = time.perf_counter()
+        results = func(lines)
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = results
+        assert results == expected, "Different output: " + name
+        print(name, "%.0f" % (len(lines) / seconds), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
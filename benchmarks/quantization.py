@@ -0,0 +1,77 @@
+"""
+Compare a trained model with its dynamically int8-quantized version (``cyber.models.quantization``) on CPU: the
+accuracy and F1 on the test split evaluated by ``test.sh`` (the archive's ``test_data_path``), the agreement of
+their predictions, and the latency per batch and throughput.
+
+Usage: python -m benchmarks.quantization MODEL.tar.gz [FILE ...] [--batch-size 32] [--num-threads N]
+
+FILEs, if given, are evaluated instead of the test split.
+"""
+import argparse
+import time
+
+import torch
+from allennlp.common.util import import_submodules
+from allennlp.data import DatasetReader
+from allennlp.data.iterators import BasicIterator
+from allennlp.models.archival import load_archive
+
+from cyber.models.quantization import quantize
+
+
+def evaluate(model, batches):
+    """
+    Returns the model's metrics, its predicted label indices, and the total seconds spent in ``forward``.
+    """
+    predictions = []
+    seconds = 0.0
+    model.get_metrics(reset=True)
+    with torch.no_grad():
+        for batch in batches:
+            start = time.perf_counter()
+            output = model(**batch)
+            seconds += time.perf_counter() - start
+            predictions += output["logits"].argmax(-1).tolist()
+    return model.get_metrics(reset=True), predictions, seconds
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("file_paths", nargs="*")
+    argparser.add_argument("--batch-size", type=int, default=32)
+    argparser.add_argument("--num-threads", type=int, help="torch threads (default: torch's default)")
+    argparser.add_argument("--include-package", action="append", default=["cyber"])
+    args = argparser.parse_args()
+    for package in args.include_package:
+        import_submodules(package)
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    archive = load_archive(args.archive_path)
+    reader = DatasetReader.from_params(archive.config["dataset_reader"].duplicate())
+    instances = reader.read(args.file_paths or archive.config["test_data_path"])
+    iterator = BasicIterator(batch_size=args.batch_size)
+    iterator.index_with(archive.model.vocab)
+    batches = list(iterator(instances, num_epochs=1, shuffle=False))
+    results = {}
+    for name in "fp32", "int8":
+        model = archive.model if name == "fp32" else quantize(load_archive(args.archive_path).model)
+        model.eval()
+        if hasattr(model, "output_attention"):
+            model.output_attention = False
+        evaluate(model, batches[:1])  # warm up
+        results[name] = evaluate(model, batches)
+    print("model", "accuracy", "f1", "ms per batch", "documents/sec", sep="\t")
+    for name, (metrics, _, seconds) in results.items():
+        print(name, "%.4f" % metrics["accuracy"], "%.4f" % metrics["f1"], "%.1f" % (1000 * seconds / len(batches)),
+              "%.1f" % (len(instances) / seconds), sep="\t")
+    (fp32_metrics, fp32_predictions, fp32_seconds), (int8_metrics, int8_predictions, int8_seconds) = \
+        results["fp32"], results["int8"]
+    print("Accuracy delta: %+.4f, F1 delta: %+.4f, speedup: %.2fx, prediction agreement: %.2f%%" % (
+        int8_metrics["accuracy"] - fp32_metrics["accuracy"], int8_metrics["f1"] - fp32_metrics["f1"],
+        fp32_seconds / int8_seconds,
+        100 * sum(a == b for a, b in zip(fp32_predictions, int8_predictions)) / len(fp32_predictions)))
+
+
+if __name__ == "__main__":
+    main()
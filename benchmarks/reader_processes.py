@@ -0,0 +1,57 @@
+"""
+Measure how ``DocumentDatasetReader`` throughput (documents/sec) scales with the number of tokenizer processes.
+
+Usage: python -m benchmarks.reader_processes [FILE ...] [--processes 1 2 4 8] [--tokenizer-batch-size 1000]
+
+By default, all files in ``data/train`` are read. First, one batch of the first file is tokenized by a pool of two
+processes and checked to have the same token attributes as tokenized in this process (tokens are sent back from
+the workers as AllenNLP tokens, since spaCy's cannot be pickled). Then instances are checked to have the same tokens
+for every number of processes.
+"""
+import argparse
+import glob
+import os
+import time
+from itertools import islice
+
+from cyber.dataset_readers import DocumentDatasetReader
+
+ATTRIBUTES = ("text", "idx", "lemma_", "pos_", "tag_", "dep_", "ent_type_")
+
+
+def check_pool(file_path, batch_size):
+    documents = list(islice(DocumentDatasetReader.fetch_documents([file_path]), batch_size))
+    results = []
+    for processes in 1, 2:
+        # noinspection PyProtectedMember
+        tokenized = DocumentDatasetReader(processes=processes, tokenizer_batch_size=batch_size)._tokenize(documents)
+        results.append([[tuple(getattr(token, attribute) for attribute in ATTRIBUTES) for token in tokens]
+                        for tokens, _ in tokenized])
+    assert results[0] == results[1], "Different token attributes from the worker pool"
+    print("Checked %d documents through a pool of 2 processes" % len(documents))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_paths", nargs="*", default=sorted(glob.glob("data/train/*.txt")))
+    argparser.add_argument("--processes", type=int, nargs="+",
+                           default=sorted({1, 2, 4, os.cpu_count()} - {None}))
+    argparser.add_argument("--tokenizer-batch-size", type=int, default=1000)
+    args = argparser.parse_args()
+    check_pool(args.file_paths[0], args.tokenizer_batch_size)
+    expected = None
+    print("processes", "documents/sec", "speedup", sep="\t")
+    for processes in args.processes:
+        reader = DocumentDatasetReader(processes=processes, tokenizer_batch_size=args.tokenizer_batch_size)
+        start = time.perf_counter()
+        instances = reader.read(args.file_paths)
+        seconds = time.perf_counter() - start
+        tokens = [[token.text for token in instance["text"].tokens] for instance in instances]
+        if expected is None:
+            expected, base_seconds = tokens, seconds
+        assert tokens == expected, "Different tokens with %d processes" % processes
+        print(processes, "%.0f" % (len(instances) / seconds), "%.2f" % (base_seconds / seconds), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
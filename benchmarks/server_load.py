@@ -0,0 +1,67 @@
+"""
+Generate load on a running prediction server (``server.sh``, or ``cyber.predictors.micro_batching``) from
+concurrent clients, and report the client-side latency percentiles and throughput.
+
+Usage: python -m benchmarks.server_load [FILE] [--url http://localhost:8001] [--clients 16] [--requests 1000]
+
+Request texts are the lines of FILE (by default, the first file in ``data/test``), cycled as needed.
+If the server has a ``/stats`` endpoint, its statistics are printed too.
+"""
+import argparse
+import glob
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from itertools import cycle, islice
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+def post(url, inputs):
+    request = urllib.request.Request(url, data=json.dumps(inputs).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def client(url, texts, latencies):
+    for text in texts:
+        start = time.perf_counter()
+        post(url + "/predict", {"text_input": text})
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_path", nargs="?", default=next(iter(sorted(glob.glob("data/test/*.txt"))), None))
+    argparser.add_argument("--url", default="http://localhost:8001")
+    argparser.add_argument("--clients", type=int, default=16)
+    argparser.add_argument("--requests", type=int, default=1000, help="total number of requests")
+    args = argparser.parse_args()
+    with open(args.file_path, encoding="utf-8") as f:
+        texts = list(islice(cycle(line.strip() for line in f if line.strip()), args.requests))
+    latencies = []
+    threads = [threading.Thread(target=client, args=(args.url, texts[i::args.clients], latencies))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    print("clients", "requests/sec", *["p%d ms" % p for p in PERCENTILES], sep="\t")
+    print(args.clients, "%.1f" % (len(latencies) / seconds),
+          *["%.1f" % (1000 * v) for v in np.percentile(latencies, PERCENTILES)], sep="\t")
+    try:
+        with urllib.request.urlopen(args.url + "/stats") as response:
+            print("Server statistics:", json.dumps(json.load(response), indent=2))
+    except urllib.error.HTTPError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
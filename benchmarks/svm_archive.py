@@ -0,0 +1,67 @@
+"""
+Report the size and load time of the serialized state of the sklearn-backed models, and the time to predict
+a batch with the restored estimator.
+
+Usage: python -m benchmarks.svm_archive [--num-documents 5000] [--vocab-size 20000] [--num-tokens 100]
+
+The state is saved with ``torch.save`` exactly as the trainer writes it into ``model.tar.gz``.
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+import torch
+from sklearn.base import clone
+from sklearn.naive_bayes import BernoulliNB
+from sklearn.svm import SVC
+
+from cyber.models.bag_of_words import bag_of_words
+from cyber.models.sklearn_classifier import dump_estimator, load_estimator
+
+ESTIMATORS = {
+    "svm": SVC(gamma='scale', cache_size=4000, max_iter=-1, tol=1e-5),
+    "svm_linear": SVC(kernel="linear", gamma='scale', cache_size=4000, max_iter=-1),
+    "naive_bayes": BernoulliNB(),
+}
+
+
+def random_features(num_documents, num_tokens, vocab_size):
+    rng = np.random.RandomState(0)
+    labels = rng.randint(0, 2, size=num_documents)
+    # Each class prefers half of the vocabulary, so that the problem is learnable but not trivial
+    tokens = rng.randint(2, vocab_size // 2, size=(num_documents, num_tokens)) + \
+        (vocab_size // 2 - 2) * (rng.rand(num_documents, num_tokens) < .3 + .4 * labels[:, None])
+    return bag_of_words(tokens, np.ones_like(tokens), vocab_size), labels
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--num-documents", type=int, default=5000)
+    argparser.add_argument("--num-tokens", type=int, default=100)
+    argparser.add_argument("--vocab-size", type=int, default=20000)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    args = argparser.parse_args()
+    features, labels = random_features(args.num_documents, args.num_tokens, args.vocab_size)
+    batch = features[:args.batch_size]
+    print("model", "fit seconds", "archive KB", "load seconds", "batch predict ms", sep="\t")
+    for name, estimator in ESTIMATORS.items():
+        estimator = clone(estimator)
+        start = time.perf_counter()
+        estimator.fit(features, labels)
+        fit_time = time.perf_counter() - start
+        buffer = io.BytesIO()
+        torch.save(dump_estimator(estimator), buffer)
+        start = time.perf_counter()
+        restored = load_estimator(clone(estimator), torch.load(io.BytesIO(buffer.getvalue())))
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        predictions = restored.predict(batch)
+        predict_time = time.perf_counter() - start
+        assert (predictions == estimator.predict(batch)).all(), "Restored %s predicts differently" % name
+        print(name, "%.2f" % fit_time, "%.1f" % (len(buffer.getvalue()) / 1024), "%.4f" % load_time,
+              "%.2f" % (1000 * predict_time), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure how the training time of the ``svm_linear`` solvers grows with the number of documents.
+
+Usage: python -m benchmarks.svm_linear_scaling [--num-documents 1000 2000 4000 8000] [--solvers libsvm liblinear sgd]
+
+The ``sgd`` solver is trained the way ``SvmLinear`` trains it: one ``partial_fit`` call per batch.
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC, LinearSVC
+
+from benchmarks.svm_archive import random_features
+
+
+def train(solver, features, labels, batch_size):
+    if solver == "libsvm":
+        SVC(kernel="linear", gamma='scale', cache_size=4000, max_iter=-1).fit(features, labels)
+    elif solver == "liblinear":
+        LinearSVC(tol=1e-5).fit(features, labels)
+    else:
+        estimator = SGDClassifier(loss="hinge")
+        for start in range(0, features.shape[0], batch_size):
+            estimator.partial_fit(features[start:start + batch_size], labels[start:start + batch_size],
+                                  classes=np.unique(labels))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--num-documents", type=int, nargs="+", default=[1000, 2000, 4000, 8000])
+    argparser.add_argument("--solvers", nargs="+", choices=("libsvm", "liblinear", "sgd"),
+                           default=["libsvm", "liblinear", "sgd"])
+    argparser.add_argument("--num-tokens", type=int, default=100)
+    argparser.add_argument("--vocab-size", type=int, default=20000)
+    argparser.add_argument("--batch-size", type=int, default=32)
+    args = argparser.parse_args()
+    print("documents", *args.solvers, sep="\t")
+    for num_documents in args.num_documents:
+        features, labels = random_features(num_documents, args.num_tokens, args.vocab_size)
+        durations = []
+        for solver in args.solvers:
+            start = time.perf_counter()
+            train(solver, features, labels, args.batch_size)
+            durations.append("%.2f" % (time.perf_counter() - start))
+        print(num_documents, *durations, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compare the time to read a dataset with ``DocumentDatasetReader`` without a token cache, with a cold cache
+(tokenizing and writing it) and with a warm cache (memory-mapping it, skipping the tokenizer).
+
+Usage: python -m benchmarks.token_cache [FILE ...] [--cache-directory DIR]
+
+By default, all files in ``data/train`` are read, and the cache is written to a temporary directory.
+"""
+import argparse
+import glob
+import tempfile
+import time
+
+from cyber.dataset_readers import DocumentDatasetReader
+
+
+def read_time(reader, file_paths):
+    start = time.perf_counter()
+    instances = reader.read(file_paths)
+    return time.perf_counter() - start, len(instances)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("file_paths", nargs="*", default=sorted(glob.glob("data/train/*.txt")))
+    argparser.add_argument("--cache-directory", help="cache directory (default: temporary; must not hold a cache "
+                                                     "of the files yet)")
+    args = argparser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_directory = args.cache_directory or tmp_dir
+        print("reader", "seconds", "instances", sep="\t")
+        for name, reader in ("no cache", DocumentDatasetReader()), \
+                            ("cold cache", DocumentDatasetReader(token_cache_directory=cache_directory)), \
+                            ("warm cache", DocumentDatasetReader(token_cache_directory=cache_directory)):
+            seconds, num_instances = read_time(reader, args.file_paths)
+            print(name, "%.2f" % seconds, num_instances, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
+import io
 import logging
-from typing import Dict, Tuple, Optional
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import get_context
+from typing import Dict, List, Tuple, Optional
 
+from allennlp.common.checks import ConfigurationError
 from allennlp.data import Token
 from allennlp.data.dataset_readers.dataset_reader import DatasetReader
 from allennlp.data.fields import Field, LabelField, TextField, MetadataField
@@ -9,39 +15,196 @@ from allennlp.data.token_indexers import TokenIndexer, SingleIdTokenIndexer
 from allennlp.data.tokenizers import Tokenizer, WordTokenizer
 from overrides import overrides
 
+from cyber.dataset_readers.token_cache import TokenCache, fingerprint
+
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 CATEGORIES = ("ebay", "illegal", "legal")
 
+BATCHES_IN_FLIGHT_PER_PROCESS = 2
+
+_worker_tokenizer: Optional[Tokenizer] = None
+
+
+def _init_worker(tokenizer: Tokenizer) -> None:
+    global _worker_tokenizer  # pylint: disable=global-statement
+    _worker_tokenizer = tokenizer
+
+
+def _picklable(token) -> Token:
+    """
+    An AllenNLP ``Token`` with the attributes of a token from any tokenizer, since spaCy's tokens cannot be pickled.
+    """
+    return Token(token.text, token.idx, token.lemma_, token.pos_, token.tag_, token.dep_, token.ent_type_)
+
+
+def _tokenize_batch(batch: Tuple[List[str], List[str]]) -> Tuple[List[List[Token]], List[str]]:
+    lines, categories = batch
+    return [[_picklable(token) for token in tokens] for tokens in _worker_tokenizer.batch_tokenize(lines)], categories
+
+
+def shard_range(size: int, shard_index: int, num_shards: int) -> Tuple[int, int]:
+    """
+    The byte range of a file of ``size`` bytes that the lines of shard ``shard_index`` of ``num_shards`` start in.
+    """
+    return size * shard_index // num_shards, size * (shard_index + 1) // num_shards
+
+
+def _batches(documents, batch_size: int):
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        lines, categories = zip(*batch)
+        yield list(lines), list(categories)
+
 
 @DatasetReader.register("document")
 class DocumentDatasetReader(DatasetReader):
-    def __init__(self, tokenizer: Tokenizer = None, token_indexers: Optional[Dict[str, TokenIndexer]] = None) -> None:
-        super().__init__()
+    """
+    Reads documents, one per line, labeled by the category in the file path.
+
+    Parameters
+    ----------
+    tokenizer : ``Tokenizer``, optional (default=``WordTokenizer()``)
+    token_indexers : ``Dict[str, TokenIndexer]``, optional (default=``{"tokens": SingleIdTokenIndexer()}``)
+    token_cache_directory : ``str``, optional (default=``None``)
+        If given, the tokens of each file are cached in this directory (see ``TokenCache``), keyed by the file's
+        path and content (only the shard's bytes, if sharded) and by the tokenizer configuration and shard, so that
+        reading the same file again skips the tokenizer. Only token strings are cached, so this is only suitable
+        for indexers that use nothing else.
+    processes : ``int``, optional (default=``1``)
+        Number of tokenizer processes. If more than one (or None, for one per CPU), documents are tokenized in
+        batches of ``tokenizer_batch_size`` with ``Tokenizer.batch_tokenize`` (``spacy.pipe`` for
+        ``WordTokenizer``) by a pool of forked worker processes, preserving their order. At most
+        ``BATCHES_IN_FLIGHT_PER_PROCESS`` batches per process are read ahead of the consumer of the instances.
+    tokenizer_batch_size : ``int``, optional (default=``1000``)
+        Number of documents sent to a worker at a time.
+    lazy : ``bool``, optional (default=``False``)
+        If True, instances are read anew in every epoch rather than kept in memory.
+    num_shards : ``int``, optional (default=``1``)
+        Split each file into this many shards of about equal size in bytes, and only read one of them.
+    shard_index : ``int``, optional (default=``0``)
+        The shard to read, between 0 and ``num_shards - 1``. Each shard seeks directly to its byte range, and every
+        line is read by exactly one shard: the one its first byte falls in. Shards are split at line feeds, but carriage
+        returns end lines too, as when reading the whole file, so the documents do not depend on the number of shards.
+    token_metadata : ``bool``, optional (default=``False``)
+        If True, add a ``MetadataField`` with the token strings of each document to every instance. This doubles
+        the memory taken by the tokens, and no model needs it for training: ``AttentionClassifier`` rebuilds the
+        tokens from their vocabulary indices when there is no metadata (with OOV tokens as ``@@UNKNOWN@@``).
+    """
+    def __init__(self,
+                 tokenizer: Tokenizer = None,
+                 token_indexers: Optional[Dict[str, TokenIndexer]] = None,
+                 token_cache_directory: Optional[str] = None,
+                 processes: Optional[int] = 1,
+                 tokenizer_batch_size: int = 1000,
+                 lazy: bool = False,
+                 num_shards: int = 1,
+                 shard_index: int = 0,
+                 token_metadata: bool = False) -> None:
+        super().__init__(lazy)
+        if not 0 <= shard_index < num_shards:
+            raise ConfigurationError("shard_index must be between 0 and num_shards - 1, but got %d with %d shards" %
+                                     (shard_index, num_shards))
         self._tokenizer = tokenizer or WordTokenizer()
         self._token_indexers = token_indexers or {"tokens": SingleIdTokenIndexer()}
+        self._token_cache = None if token_cache_directory is None else TokenCache(token_cache_directory)
+        self._tokenizer_fingerprint: Optional[str] = None
+        self._processes = processes
+        self._tokenizer_batch_size = tokenizer_batch_size
+        self._num_shards = num_shards
+        self._shard_index = shard_index
+        self._token_metadata = token_metadata
 
     @overrides
     def _read(self, file_paths):
         logger.info("Reading instances from " + ", ".join(file_paths))
-        for line, category in self.fetch_documents(file_paths):
-            yield self.text_to_instance(line, category)
+        if self._token_cache is None:
+            documents = self._tokenize(self.fetch_documents(file_paths, self._shard_index, self._num_shards))
+        else:
+            documents = ((tokens, self.get_category(file_path))
+                         for file_path in file_paths for tokens in self._read_tokens(file_path))
+        for tokens, category in documents:
+            yield self.tokens_to_instance(tokens, category)
+
+    def _tokenize(self, documents):
+        """
+        Yields ``(tokens, category)`` for each ``(line, category)`` in ``documents``, in the same order.
+        """
+        if self._processes == 1:
+            for line, category in documents:
+                yield self._tokenizer.tokenize(line), category
+            return
+        # Unlike Pool.imap, which submits every batch as fast as it can read them, keep a bounded window of batches
+        # in flight, so that documents are not read (and tokenized) much faster than they are consumed
+        max_in_flight = BATCHES_IN_FLIGHT_PER_PROCESS * (self._processes or os.cpu_count() or 1)
+        in_flight = deque()
+        # Workers are forked, so the tokenizer (and its spaCy model) is inherited rather than pickled
+        with get_context("fork").Pool(self._processes, initializer=_init_worker,
+                                      initargs=(self._tokenizer,)) as pool:
+            for batch in _batches(documents, self._tokenizer_batch_size):
+                in_flight.append(pool.apply_async(_tokenize_batch, (batch,)))
+                if len(in_flight) >= max_in_flight:
+                    yield from zip(*in_flight.popleft().get())
+            while in_flight:
+                yield from zip(*in_flight.popleft().get())
+
+    def _read_tokens(self, file_path: str):
+        if self._tokenizer_fingerprint is None:
+            self._tokenizer_fingerprint = fingerprint(self._tokenizer)
+        key = self._token_cache.key(file_path, "%s\nshard %d/%d" % (self._tokenizer_fingerprint, self._shard_index,
+                                                                     self._num_shards),
+                                    *shard_range(os.path.getsize(file_path), self._shard_index, self._num_shards))
+        cached = self._token_cache.load(key)
+        if cached is not None:
+            logger.info("Loading cached tokens of " + file_path)
+            yield from cached
+            return
+        documents = self._tokenize(self.fetch_documents([file_path], self._shard_index, self._num_shards))
+        yield from self._token_cache.record(key, (tokens for tokens, _ in documents))
 
     @overrides
-    def text_to_instance(self, text: str, target: int = None) -> Instance:
-        tokens = self._tokenizer.tokenize(text)
+    def text_to_instance(self, text: str, target: int = None, token_metadata: Optional[bool] = None) -> Instance:
+        """
+        ``token_metadata`` overrides the reader's setting if given.
+        """
+        return self.tokens_to_instance(self._tokenizer.tokenize(text), target, token_metadata)
+
+    def tokens_to_instance(self, tokens: List[Token], target: int = None,
+                           token_metadata: Optional[bool] = None) -> Instance:
         text_field = TextField(tokens, self._token_indexers)
-        metadata = {"tokens": [token.text for token in tokens]}
         fields: Dict[str, Field] = {"text": text_field}
         if target is not None:
             fields["label"] = LabelField(target)
-        fields["metadata"] = MetadataField(metadata)
+        if self._token_metadata if token_metadata is None else token_metadata:
+            fields["metadata"] = MetadataField({"tokens": [token.text for token in tokens]})
         return Instance(fields)
 
     @staticmethod
-    def fetch_documents(file_paths):
+    def get_category(file_path):
+        return next((c for c in CATEGORIES if c in file_path), None)
+
+    @staticmethod
+    def fetch_documents(file_paths, shard_index=0, num_shards=1):
         for file_path in file_paths:
-            category = next((c for c in CATEGORIES if c in file_path), None)
-            with open(file_path, encoding="utf-8") as f:
-                for line in f:
-                    yield line, category
+            category = DocumentDatasetReader.get_category(file_path)
+            if num_shards == 1:
+                with open(file_path, encoding="utf-8") as f:
+                    for line in f:
+                        yield line, category
+                continue
+            start, end = shard_range(os.path.getsize(file_path), shard_index, num_shards)
+            with open(file_path, "rb") as f:
+                if start:
+                    f.seek(start - 1)
+                    start += len(f.readline()) - 1  # skip the rest of the line that started in the previous shard
+                while start < end:
+                    line = f.readline()
+                    if not line:
+                        break
+                    start += len(line)
+                    # Split and translate newlines as text mode does without sharding: "\r" and "\r\n" end lines too
+                    for text_line in io.StringIO(line.decode("utf-8"), newline=None):
+                        yield text_line, category
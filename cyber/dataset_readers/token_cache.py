@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import os
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+from allennlp.data import Token
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def fingerprint(obj, depth: int = 3) -> str:
+    """
+    A deterministic description of an object's configuration: its class and, up to ``depth`` levels deep, its
+    attributes. Beyond that depth, and for attribute types other than primitives and containers, only the
+    class name is included.
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return repr(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [fingerprint(item, depth) for item in obj]
+        return "[%s]" % ",".join(sorted(items) if isinstance(obj, (set, frozenset)) else items)
+    if isinstance(obj, dict):
+        return "{%s}" % ",".join("%s:%s" % (key, fingerprint(value, depth)) for key, value in
+                                 sorted(obj.items(), key=lambda item: str(item[0])))
+    name = type(obj).__module__ + "." + type(obj).__qualname__
+    if depth == 0 or not hasattr(obj, "__dict__"):
+        return name
+    return "%s(%s)" % (name, ",".join("%s=%s" % (key, fingerprint(value, depth - 1))
+                                      for key, value in sorted(vars(obj).items())))
+
+
+class TokenCache:
+    """
+    An on-disk cache of tokenized files. Each file (or shard of one) is keyed by the SHA-1 of its content, its
+    absolute path and the configuration it was read with, and is stored as three files: ``<key>.vocab.json`` with
+    the distinct token strings, ``<key>.ids.npy`` with the ``int32`` vocabulary index of every token, and
+    ``<key>.offsets.npy`` with the ``int64`` offset of every document's first token (and the total number of tokens
+    last). The arrays are memory-mapped on load, and the vocabulary file is written last, so that its presence marks
+    a complete entry.
+
+    Only the token strings are kept, so cached tokens have no offsets, lemmas or tags.
+    """
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, file_path: str, config: str, start: int = 0, end: Optional[int] = None) -> str:
+        """
+        Returns the key of a file read with the given configuration (e.g., the tokenizer fingerprint and shard).
+        For a shard whose lines start in the byte range ``[start, end)``, only the bytes that reading it touches are
+        hashed: from the byte before ``start`` (to tell whether a line starts there) to the end of the line that
+        ``end`` falls in, so that every shard of a large file can check the cache without reading all of it.
+        """
+        size = os.path.getsize(file_path)
+        end = size if end is None else end
+        content_hash = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            f.seek(max(start - 1, 0))
+            remaining = end - max(start - 1, 0)
+            for block in iter(lambda: f.read(min(1 << 20, remaining)), b""):
+                content_hash.update(block)
+                remaining -= len(block)
+            content_hash.update(f.readline())  # the rest of the last line
+        return hashlib.sha1("\n".join((content_hash.hexdigest(), str(size), os.path.abspath(file_path),
+                                       config)).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self._directory, "%s.%s" % (key, suffix))
+
+    def load(self, key: str) -> Optional[Iterator[List[Token]]]:
+        """
+        Returns an iterator over the cached documents' tokens, or None if the key is not cached.
+        """
+        if not os.path.exists(self._path(key, "vocab.json")):
+            return None
+        with open(self._path(key, "vocab.json"), encoding="utf-8") as f:
+            # Indexers do not modify tokens, so one object per distinct string is shared by all documents
+            vocab = [Token(text) for text in json.load(f)]
+        ids = np.load(self._path(key, "ids.npy"), mmap_mode="r")
+        offsets = np.load(self._path(key, "offsets.npy"), mmap_mode="r")
+        return ([vocab[i] for i in ids[start:end].tolist()] for start, end in zip(offsets[:-1], offsets[1:]))
+
+    def record(self, key: str, documents: Iterable[List[Token]]) -> Iterator[List[Token]]:
+        """
+        Yields the documents, and caches them once all have been yielded. Only the token indices are kept
+        in the meantime, at four bytes per token.
+        """
+        vocab = {}
+        ids = array("i")
+        offsets = array("q", [0])
+        for tokens in documents:
+            ids.extend(vocab.setdefault(token.text, len(vocab)) for token in tokens)
+            offsets.append(len(ids))
+            yield tokens
+        for suffix, obj in ("ids.npy", np.frombuffer(ids, dtype=np.int32)), \
+                           ("offsets.npy", np.frombuffer(offsets, dtype=np.int64)), ("vocab.json", list(vocab)):
+            path = self._path(key, suffix)
+            tmp_path = "%s.%d.tmp" % (path, os.getpid())
+            if suffix.endswith(".npy"):
+                with open(tmp_path, "wb") as f:
+                    np.save(f, obj)
+            else:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(obj, f)
+            os.replace(tmp_path, path)
+        logger.info("Cached %d tokens of %d documents as %s", len(ids), len(offsets) - 1, key)
+
+    def save(self, key: str, documents: Iterable[List[Token]]) -> None:
+        for _ in self.record(key, documents):
+            pass
@@ -1,47 +1,141 @@
-from collections import Counter, defaultdict
-from itertools import repeat
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 import torch
+from allennlp.common.checks import ConfigurationError
+from allennlp.data import Vocabulary
 from allennlp.training.metrics.metric import Metric
 from overrides import overrides
 
 
+EXPORT_MODES = ("off", "reset", "periodic")
+
+
 @Metric.register("attention")
 class AttentionMetric(Metric):
-    def __init__(self) -> None:
-        self._cumulative_attention = defaultdict(float)
-        self._occurrences = Counter()
+    """
+    Accumulates, per predicted label and token, the number of occurrences and the total self-attention weight
+    (normalized by the length of the document). Tokens are keyed by their vocabulary index, and the sums are
+    kept in flat ``(num_labels * vocab_size)`` tensors on the device of the attention weights, updated with
+    ``scatter_add_``. Token strings are only looked up in ``get_metric``.
+
+    Parameters
+    ----------
+    vocab : ``Vocabulary``, required
+        Used to map token and label indices back to strings.
+    namespace : ``str``, optional (default=``"tokens"``)
+        The vocabulary namespace of the token indices.
+    label_namespace : ``str``, optional (default=``"labels"``)
+        The vocabulary namespace of the labels.
+    export : ``str``, optional (default=``"reset"``)
+        When to write the accumulated attention to ``export_path``: ``"off"`` never writes it, ``"reset"`` writes
+        it when the metric is reset (at the end of each epoch), and ``"periodic"`` appends a checkpoint every
+        ``export_every`` calls to ``get_metric``, preceded by a column with the checkpoint number.
+    export_path : ``str``, optional (default=``"attention.tsv"``)
+        The file to write to.
+    export_every : ``int``, optional (default=``1000``)
+        How many ``get_metric`` calls (usually batches) to wait between checkpoints in ``"periodic"`` mode.
+    export_top_k : ``int``, optional (default=``None``)
+        If given, only the ``export_top_k`` most frequent keys are written, found without sorting all of them.
+    """
+    def __init__(self,
+                 vocab: Vocabulary,
+                 namespace: str = "tokens",
+                 label_namespace: str = "labels",
+                 export: str = "reset",
+                 export_path: str = "attention.tsv",
+                 export_every: int = 1000,
+                 export_top_k: Optional[int] = None) -> None:
+        if export not in EXPORT_MODES:
+            raise ConfigurationError("Unknown export mode '%s', must be one of: %s" % (export,
+                                                                                      ", ".join(EXPORT_MODES)))
+        self._vocab = vocab
+        self._namespace = namespace
+        self._label_namespace = label_namespace
+        self._vocab_size = vocab.get_vocab_size(namespace)
+        self._export = export
+        self._export_path = export_path
+        self._export_every = export_every
+        self._export_top_k = export_top_k
+        self._num_calls = 0
+        self._num_checkpoints = 0
+        self._cumulative_attention: Optional[torch.Tensor] = None
+        self._occurrences: Optional[torch.Tensor] = None
 
     @overrides
     def __call__(self,
-                 tokens: List[List[str]],
+                 token_ids: torch.LongTensor,
                  self_weights: torch.Tensor,
-                 labels: List[torch.Tensor],
+                 labels: torch.LongTensor,
                  mask: Optional[torch.Tensor] = None):
-        self_weights, mask = self.unwrap_to_tensors(self_weights, mask)
+        """
+        Parameters
+        ----------
+        token_ids : ``torch.LongTensor``
+            Token indices of shape ``(batch_size, num_tokens)``.
+        self_weights : ``torch.Tensor``
+            Attention weights of the same shape.
+        labels : ``torch.LongTensor``
+            Predicted label index of each instance, of shape ``(batch_size,)``.
+        mask : ``torch.Tensor``, optional (default = None)
+            Zero for padding, of the same shape as ``token_ids``.
+        """
+        self_weights = self_weights.detach()
+        mask = torch.ones_like(self_weights) if mask is None else mask.detach().to(self_weights.dtype)
+        if self._occurrences is None:
+            size = self._vocab.get_vocab_size(self._label_namespace) * self._vocab_size
+            self._cumulative_attention = self_weights.new_zeros(size, dtype=torch.float64)
+            self._occurrences = self_weights.new_zeros(size, dtype=torch.long)
         # Normalize by the length of the sentence
-        weights = self_weights * self_weights.eq(0).eq(0).sum(1).unsqueeze(1).type(torch.FloatTensor)
-        for instance_tokens, instance_weights, label, instance_mask in zip(tokens, weights, labels,
-                                                                           repeat(None) if mask is None else mask):
-            for token, weight, token_mask in zip(instance_tokens, instance_weights, instance_mask):
-                if mask is None or token_mask:
-                    key = "\t".join((label, token))
-                    self._cumulative_attention[key] += weight.item()
-                    self._occurrences[key] += 1
+        weights = self_weights * self_weights.ne(0).sum(1, keepdim=True).to(self_weights.dtype) * mask
+        keys = (labels.detach().unsqueeze(1) * self._vocab_size + token_ids.detach()).view(-1)
+        self._cumulative_attention.scatter_add_(0, keys, weights.view(-1).to(torch.float64))
+        self._occurrences.scatter_add_(0, keys, mask.view(-1).long())
+
+    def _key(self, index: int) -> str:
+        label, token = divmod(index, self._vocab_size)
+        return "\t".join((self._vocab.get_token_from_index(label, namespace=self._label_namespace),
+                          self._vocab.get_token_from_index(token, namespace=self._namespace)))
+
+    def most_common(self, k: Optional[int] = None) -> List[Tuple[int, int, float]]:
+        """
+        Returns ``(key index, occurrences, cumulative attention)`` for the ``k`` most frequent keys (or all seen
+        keys if ``k`` is None), most frequent first. Only the selected keys are sorted.
+        """
+        if self._occurrences is None:
+            return []
+        num_seen = int(self._occurrences.ne(0).sum())
+        occurrences, order = self._occurrences.topk(num_seen if k is None else min(k, num_seen))
+        return list(zip(order.tolist(), occurrences.tolist(), self._cumulative_attention[order].tolist()))
+
+    def export(self, mode: str = "w", checkpoint: Optional[int] = None) -> None:
+        with open(self._export_path, mode, encoding="utf-8") as f:
+            for index, occurrences, attention in self.most_common(self._export_top_k):
+                print(*([] if checkpoint is None else [checkpoint]), self._key(index), occurrences, attention,
+                      sep="\t", file=f)
 
     @overrides
-    def get_metric(self, reset: bool = False):
-        if self._occurrences:
-            with open("attention.tsv", "w", encoding="utf-8") as f:
-                for word, occurrences in self._occurrences.most_common():
-                    print(word, occurrences, self._cumulative_attention[word], sep="\t", file=f)
-        average_attention = Counter(**{k: v / self._occurrences[k] for k, v in self._cumulative_attention.items()})
+    def get_metric(self, reset: bool = False) -> List[Tuple[str, float]]:
+        """
+        Returns the key with the highest average attention along with that average, and writes the accumulated
+        attention if the export mode says so.
+        """
+        most_attended = []
+        self._num_calls += 1
+        if self._occurrences is not None and self._occurrences.any():
+            average_attention = (self._cumulative_attention / self._occurrences.clamp(min=1).double()).masked_fill(
+                self._occurrences.eq(0), -float("inf"))
+            best = average_attention.argmax().item()
+            most_attended = [(self._key(best), average_attention[best].item())]
+            if self._export == "reset" and reset:
+                self.export()
+            elif self._export == "periodic" and self._num_calls % self._export_every == 0:
+                self._num_checkpoints += 1
+                self.export(mode="w" if self._num_checkpoints == 1 else "a", checkpoint=self._num_checkpoints)
         if reset:
             self.reset()
-        return average_attention.most_common(1)
+        return most_attended
 
     @overrides
     def reset(self):
-        self._cumulative_attention.clear()
-        self._occurrences.clear()
+        self._cumulative_attention = None
+        self._occurrences = None
@@ -14,6 +14,9 @@ from torch import nn
 
 from cyber.metrics.attention import AttentionMetric
 from cyber.models.document_classifier import DocumentClassifier
+from cyber.modules.blockwise_attention import blockwise_self_attention
+from cyber.modules.elmo_cache import ElmoActivationCache
+from cyber.modules.masked_pooling import MaskedPooling
 
 
 # noinspection PyProtectedMember
@@ -66,6 +69,28 @@ class AttentionClassifier(DocumentClassifier):
         If true, concatenate pretrained ELMo representations to the input vectors.
     use_integrator_output_elmo : ``bool`` (default=``False``)
         If true, concatenate pretrained ELMo representations to the integrator output.
+    attention_export : ``str`` (default=``"reset"``)
+        When to write the attention accumulated by the ``AttentionMetric``: ``"off"``, ``"reset"`` (at the end
+        of each epoch) or ``"periodic"`` (append every ``attention_export_every`` batches).
+    attention_export_path : ``str`` (default=``"attention.tsv"``)
+        Where to write the accumulated attention.
+    attention_export_every : ``int`` (default=``1000``)
+        Number of batches between exports in ``"periodic"`` mode.
+    attention_export_top_k : ``int``, optional (default=``None``)
+        If given, only export the most frequent label-token pairs.
+    output_attention : ``bool`` (default=``True``)
+        If false, ``forward`` only outputs logits, probabilities and the loss, without the attention weights
+        (of size ``batch_size * num_tokens ** 2``) or tokens, and the ``AttentionMetric`` is not updated.
+        Can be changed after construction, e.g. by the ``attention_classifier_light`` predictor.
+    elmo_cache_directory : ``str``, optional (default=``None``)
+        If given, the ELMo biLM activations of each document are computed the first time it is seen and stored in
+        this directory (see ``ElmoActivationCache``), so that later epochs only run the scalar mixes. Requires a
+        frozen ELMo (``requires_grad: false``, the default). The cache is only opened once the model is first run
+        in training mode, so a model loaded from an archive to predict or evaluate neither reads nor fills it.
+    attention_block_size : ``int``, optional (default=``None``)
+        If given, biattention is computed for this many tokens at a time (see ``blockwise_self_attention``), so
+        that memory grows linearly rather than quadratically with the document length. The attention weights
+        are then never computed as a whole, and not output.
     initializer : ``InitializerApplicator``, optional (default=``InitializerApplicator()``)
         Used to initialize the model parameters.
     regularizer : ``RegularizerApplicator``, optional (default=``None``)
@@ -83,6 +108,13 @@ class AttentionClassifier(DocumentClassifier):
                  elmo: Elmo,
                  use_input_elmo: bool = False,
                  use_integrator_output_elmo: bool = False,
+                 attention_export: str = "reset",
+                 attention_export_path: str = "attention.tsv",
+                 attention_export_every: int = 1000,
+                 attention_export_top_k: Optional[int] = None,
+                 output_attention: bool = True,
+                 elmo_cache_directory: Optional[str] = None,
+                 attention_block_size: Optional[int] = None,
                  initializer: InitializerApplicator = InitializerApplicator(),
                  regularizer: Optional[RegularizerApplicator] = None) -> None:
         super(AttentionClassifier, self).__init__(vocab, regularizer)
@@ -105,13 +137,17 @@ class AttentionClassifier(DocumentClassifier):
         self._use_input_elmo = use_input_elmo
         self._use_integrator_output_elmo = use_integrator_output_elmo
         self._num_elmo_layers = int(self._use_input_elmo) + int(self._use_integrator_output_elmo)
+        self._elmo_cache_directory = elmo_cache_directory if elmo else None
+        self._elmo_cache: Optional[ElmoActivationCache] = None
 
         # Calculate combined integrator output dim, taking into account elmo
         self._combined_integrator_output_dim = self._integrator.get_output_dim()
         if self._use_integrator_output_elmo:
             self._combined_integrator_output_dim += self._elmo.get_output_dim()
 
+        self._attention_block_size = attention_block_size
         self._self_attentive_pooling_projection = nn.Linear(self._combined_integrator_output_dim, 1)
+        self._pooling = MaskedPooling()
         self._output_layer = output_layer
 
         self.check_input()
@@ -119,7 +155,10 @@ class AttentionClassifier(DocumentClassifier):
         self.loss = torch.nn.CrossEntropyLoss()
         initializer(self)
 
-        self._attention_metric = AttentionMetric()
+        self._attention_metric = AttentionMetric(vocab, export=attention_export, export_path=attention_export_path,
+                                                 export_every=attention_export_every,
+                                                 export_top_k=attention_export_top_k)
+        self.output_attention = output_attention
 
     def check_input(self):
         if self._elmo is None:  # Check that, if elmo is None, none of the elmo flags are set.
@@ -176,10 +215,14 @@ class AttentionClassifier(DocumentClassifier):
             distribution over the label classes for each instance.
         loss : torch.FloatTensor, optional
             A scalar loss to be optimised.
-        self_weights : torch.FloatTensor
-            Attention weights.
+        attention_weights : torch.FloatTensor, optional
+            Biattention weights, unless ``output_attention`` is false or ``attention_block_size`` is given.
+        self_weights : torch.FloatTensor, optional
+            Self-attentive pooling weights, unless ``output_attention`` is false.
         tokens : List, optional
-            Tokens for each instance.
+            Tokens for each instance, if given in ``metadata``.
+        token_ids : torch.LongTensor, optional
+            Otherwise, the token indices, from which ``decode`` rebuilds the tokens.
 
         """
         text_mask = util.get_text_field_mask(text).float()
@@ -194,7 +237,12 @@ class AttentionClassifier(DocumentClassifier):
         if self._elmo:
             if elmo_tokens is None:
                 raise ConfigurationError("Model was built to use Elmo, but input text is not tokenized for Elmo.")
-            elmo_representations = self._elmo(elmo_tokens)["elmo_representations"]
+            if self._elmo_cache is None and self._elmo_cache_directory and self.training:
+                self._elmo_cache = ElmoActivationCache(self._elmo_cache_directory)
+            if self._elmo_cache is None:
+                elmo_representations = self._elmo(elmo_tokens)["elmo_representations"]
+            else:
+                elmo_representations = self._elmo_cache(self._elmo, elmo_tokens)["elmo_representations"]
             if self._use_integrator_output_elmo:
                 integrator_output_elmo = elmo_representations.pop()  # Pop from the end is more performant with list
             if self._use_input_elmo:
@@ -208,9 +256,13 @@ class AttentionClassifier(DocumentClassifier):
         pre_encoded_text = self._pre_encode_feedforward(dropped_embedded_text)
         encoded_tokens = self._encoder(pre_encoded_text, text_mask)
 
-        attention_logits = encoded_tokens.bmm(encoded_tokens.permute(0, 2, 1).contiguous())  # Compute biattention
-        attention_weights = util.masked_softmax(attention_logits, text_mask)  # This is a special case,
-        encoded_text = util.weighted_sum(encoded_tokens, attention_weights)  # since the inputs are the same
+        attention_weights = None
+        if self._attention_block_size:
+            encoded_text = blockwise_self_attention(encoded_tokens, text_mask, self._attention_block_size)
+        else:
+            attention_logits = encoded_tokens.bmm(encoded_tokens.permute(0, 2, 1).contiguous())  # Biattention
+            attention_weights = util.masked_softmax(attention_logits, text_mask)  # This is a special case,
+            encoded_text = util.weighted_sum(encoded_tokens, attention_weights)  # since the inputs are the same
 
         integrator_input = torch.cat([encoded_tokens,  # Build the input to the integrator
                                       encoded_tokens - encoded_text,
@@ -221,22 +273,13 @@ class AttentionClassifier(DocumentClassifier):
         if self._use_integrator_output_elmo:
             integrated_encodings = torch.cat([integrated_encodings, integrator_output_elmo], dim=-1)
 
-        max_masked_integrated_encodings = util.replace_masked_values(  # Simple Pooling layers
-            integrated_encodings, text_mask.unsqueeze(2), -1e7)
-        max_pool = torch.max(max_masked_integrated_encodings, 1)[0]
-        min_masked_integrated_encodings = util.replace_masked_values(
-                integrated_encodings, text_mask.unsqueeze(2), +1e7)
-        min_pool = torch.min(min_masked_integrated_encodings, 1)[0]
-        mean_pool = torch.sum(integrated_encodings, 1) / torch.sum(text_mask, 1, keepdim=True)
-
         # Self-attentive pooling layer
         # Run through linear projection. Shape: (batch_size, sequence length, 1)
         # Then remove the last dimension to get the proper attention shape (batch_size, sequence length)
         self_attentive_logits = self._self_attentive_pooling_projection(integrated_encodings).squeeze(2)
-        self_weights = util.masked_softmax(self_attentive_logits, text_mask)
-        self_attentive_pool = util.weighted_sum(integrated_encodings, self_weights)
 
-        pooled_representations = torch.cat([max_pool, min_pool, mean_pool, self_attentive_pool], 1)
+        # Max, min, mean and self-attentive pooling, concatenated
+        pooled_representations, self_weights = self._pooling(integrated_encodings, text_mask, self_attentive_logits)
         pooled_representations_dropped = self._integrator_dropout(pooled_representations)
 
         logits = self._output_layer(pooled_representations_dropped)
@@ -245,8 +288,6 @@ class AttentionClassifier(DocumentClassifier):
         output_dict = {
             "logits": logits,
             "class_probabilities": class_probabilities,
-            "attention_weights": attention_weights,
-            "self_weights": self_weights,
         }
         if label is not None:
             loss = self.loss(logits, label)
@@ -254,12 +295,17 @@ class AttentionClassifier(DocumentClassifier):
                 metric(logits, label)
             output_dict["loss"] = loss
 
+        if not self.output_attention:
+            return output_dict
+        if attention_weights is not None:
+            output_dict["attention_weights"] = attention_weights
+        output_dict["self_weights"] = self_weights
         if metadata is not None:
-            tokens = [metadata[i]["tokens"] for i in range(batch_size)]
-            output_dict["tokens"] = tokens
-            labels = [self.vocab.get_token_from_index(x, namespace="labels") for x in
-                      numpy.argmax(class_probabilities.cpu().data.numpy(), axis=-1)]
-            self._attention_metric(tokens, self_weights, labels, text_mask)
+            output_dict["tokens"] = [metadata[i]["tokens"] for i in range(batch_size)]
+        elif "tokens" in text:
+            output_dict["token_ids"] = text["tokens"]
+        if "tokens" in text:
+            self._attention_metric(text["tokens"], self_weights, class_probabilities.argmax(-1), text_mask)
 
         return output_dict
 
@@ -268,11 +314,16 @@ class AttentionClassifier(DocumentClassifier):
     def decode(self, output_dict: Dict[str, torch.Tensor]) -> Dict[str, Union[torch.Tensor, List[Any]]]:
         """
         Does a simple argmax over the class probabilities, converts indices to string labels, and
-        adds a ``"label"`` key to the dictionary with the result.
+        adds a ``"label"`` key to the dictionary with the result. If the tokens were not given as metadata,
+        they are looked up in the vocabulary by their indices.
         """
         predictions = output_dict["class_probabilities"].cpu().data.numpy()
         argmax_indices = numpy.argmax(predictions, axis=-1)
-        batch_size = len(output_dict["tokens"])
+        batch_size = len(predictions)
+        token_ids = output_dict.pop("token_ids", None)
+        if "tokens" not in output_dict and token_ids is not None:
+            output_dict["tokens"] = [[self.vocab.get_token_from_index(i) for i in instance_ids if i]
+                                     for instance_ids in token_ids.tolist()]
         output_dict["label"] = [self.vocab.get_token_from_index(x, namespace="labels") for x in argmax_indices]
         output_dict["all_labels"] = batch_size * [
             [v for k, v in sorted(self.vocab.get_index_to_token_vocabulary("labels").items())]
@@ -0,0 +1,31 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def bag_of_words(tokens: np.ndarray, mask: np.ndarray, vocab_size: int, binary: bool = False) -> csr_matrix:
+    """
+    Turns a padded batch of token indices into a sparse bag-of-words matrix, without going through a dense
+    one-hot tensor of shape ``(batch_size, num_tokens, vocab_size)``.
+
+    Parameters
+    ----------
+    tokens : ``np.ndarray``
+        Token indices of shape ``(batch_size, num_tokens)``.
+    mask : ``np.ndarray``
+        Text field mask of the same shape, zero for padding.
+    vocab_size : ``int``
+        Number of columns of the output (the size of the "tokens" namespace).
+    binary : ``bool``, optional (default=``False``)
+        If true, every present token gets the value 1 instead of its count.
+    Returns
+    -------
+    A ``csr_matrix`` of shape ``(batch_size, vocab_size)``, where column ``i`` corresponds to token index ``i``.
+    """
+    mask = mask.astype(bool)
+    indptr = np.concatenate(([0], np.cumsum(mask.sum(1))))
+    indices = tokens[mask]
+    bow = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(tokens.shape[0], vocab_size))
+    bow.sum_duplicates()
+    if binary:
+        bow.data[:] = 1
+    return bow
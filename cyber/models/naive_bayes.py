@@ -1,48 +1,57 @@
 import csv
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional
 
 import numpy as np
 import torch
-import torch.nn as nn
 from allennlp.data import Vocabulary
 from allennlp.models.model import Model
-from allennlp.nn import util
 from overrides import overrides
+from scipy.sparse import csr_matrix
+from sklearn.base import clone
 from sklearn.naive_bayes import BernoulliNB
 
-from cyber.models.document_classifier import DocumentClassifier
+from cyber.models.sklearn_classifier import SklearnClassifier
 
 
 @Model.register("naive_bayes")
-class NaiveBayes(DocumentClassifier):
-    def __init__(self, vocab: Vocabulary) -> None:
-        super(NaiveBayes, self).__init__(vocab)
+class NaiveBayes(SklearnClassifier):
+    """
+    Bernoulli naive Bayes over bag-of-words features.
 
-        self.vocab_size = self.vocab.get_vocab_size("tokens")
-        self.num_classes = self.vocab.get_vocab_size("labels")
-        self.nb = BernoulliNB()
-        # noinspection PyCallingNonCallable
-        self.dummy = nn.Parameter(torch.tensor(0.0))
+    Parameters
+    ----------
+    vocab : ``Vocabulary``, required
+        A Vocabulary, required in order to compute the number of features and classes.
+    export_path : ``str``, optional (default=``"nb.tsv"``)
+        After each fit (once per epoch), the log prior of the positive class and, for each token, its log
+        probability given the positive class and its count per class are written to this file.
+        If None, nothing is written.
+    """
+    output_key = "log_proba"
+
+    def __init__(self, vocab: Vocabulary, export_path: Optional[str] = "nb.tsv") -> None:
+        super(NaiveBayes, self).__init__(vocab, BernoulliNB())
+        self.export_path = export_path
 
     @overrides
-    def forward(self, text: Dict[str, torch.LongTensor],
-                label: torch.LongTensor = None,
-                metadata: Optional[List[Dict[str, Any]]] = None) -> Dict[str, torch.Tensor]:
-        text_mask = util.get_text_field_mask(text).numpy()
-        tokens = text["tokens"].numpy()
-        bow = np.eye(self.vocab_size + 1, dtype=int)[text_mask * (tokens + 1)].sum(1)[:, 1:]
-        self.nb.partial_fit(bow, label, classes=list(range(self.num_classes)))
-        # noinspection PyCallingNonCallable
-        log_proba = torch.tensor(self.nb.predict_log_proba(bow))
+    def _fit(self, features: csr_matrix, labels: np.ndarray) -> None:
+        # Start over rather than keep counting the previous epochs, but make sure all classes are known
+        self.estimator = clone(self.estimator)
+        self.estimator.partial_fit(features, labels, classes=list(range(self.num_classes)))
+        if self.export_path is not None:
+            self.export()
 
-        output_dict = {"log_proba": log_proba}
-        if label is not None:
-            for metric in self.metrics.values():
-                metric(log_proba, label)
-            # noinspection PyCallingNonCallable
-            output_dict["loss"] = torch.tensor(self.nb.score(bow, label)) + self.dummy
+    def export(self) -> None:
+        with open(self.export_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow(["", self.estimator.class_log_prior_[1], "", ""])
+            writer.writerows(zip(self.vocab.get_token_to_index_vocabulary(), self.estimator.feature_log_prob_[1],
+                                 *self.estimator.feature_count_))
 
-        return output_dict
+    @overrides
+    def predict_scores(self, bow: csr_matrix) -> torch.Tensor:
+        # noinspection PyCallingNonCallable
+        return torch.tensor(self.estimator.predict_log_proba(bow))
 
     @overrides
     def decode(self, output_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
@@ -64,25 +73,3 @@ class NaiveBayes(DocumentClassifier):
         return {"accuracy": self.metrics["accuracy"].get_metric(reset=reset),
                 "precision": precision, "recall": recall, "f1": f1,
                 "tp": tp, "tn": tn, "fp": fp, "fn": fn}
-
-    def state_dict(self, *args, **kwargs):
-        del args, kwargs
-        with open("nb.tsv", "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f, delimiter="\t")
-            writer.writerow(["", self.nb.intercept_[0], "", ""])
-            writer.writerows(zip(self.vocab.get_token_to_index_vocabulary(), self.nb.coef_[0], *self.nb.feature_count_))
-        return dict(
-            class_count=self.nb.class_count_,
-            class_log_prior=self.nb.class_log_prior_,
-            coef=self.nb.coef_,
-            feature_count=self.nb.feature_count_,
-            feature_log_prob=self.nb.feature_log_prob_,
-            intercept=self.nb.intercept_,
-        )
-
-    def _load_from_state_dict(self, state_dict, *args, **kwargs):
-        del args, kwargs
-        self.nb.class_count_ = state_dict["class_count"]
-        self.nb.class_log_prior_ = state_dict["class_log_prior"]
-        self.nb.feature_count_ = state_dict["feature_count"]
-        self.nb.feature_log_prob_ = state_dict["feature_log_prob"]
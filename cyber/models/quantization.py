@@ -0,0 +1,40 @@
+from typing import Tuple
+
+import torch
+from allennlp.common.checks import ConfigurationError
+from allennlp.models.model import Model
+from torch import nn
+
+from cyber.models.attention_classifier import AttentionClassifier
+from cyber.models.seq2vec_classifier import Seq2VecClassifier
+
+
+def quantized_modules(model: Model) -> Tuple[str, ...]:
+    """
+    Returns the names of the submodules of ``model`` whose LSTM and Linear layers ``quantize`` converts: the
+    encoders and feedforward layers, but not the embeddings, ELMo or the self-attentive pooling projection.
+    """
+    if isinstance(model, AttentionClassifier):
+        return "_pre_encode_feedforward", "_encoder", "_integrator", "_output_layer"
+    if isinstance(model, Seq2VecClassifier):
+        return "internal_text_encoder", "output_layer"
+    raise ConfigurationError("Quantization is only supported for attention_classifier and seq2vec_classifier "
+                             "models, not %s" % type(model).__name__)
+
+
+def quantize(model: Model) -> Model:
+    """
+    Applies dynamic int8 quantization to the LSTM and Linear layers of ``quantized_modules(model)``, in place: their
+    weights are stored as int8, and their inputs are quantized on the fly, batch by batch. The model is put in
+    evaluation mode, and can then only be used for prediction on CPU.
+    """
+    if not hasattr(torch, "quantization") or not hasattr(torch.quantization, "quantize_dynamic"):
+        raise ConfigurationError("Dynamic quantization requires PyTorch 1.3 or later")
+    names = quantized_modules(model)
+    if any(parameter.is_cuda for parameter in model.parameters()):
+        raise ConfigurationError("Quantized models only run on CPU: load the archive with cuda_device=-1")
+    model.eval()
+    for name in names:
+        module = torch.quantization.quantize_dynamic(getattr(model, name), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        setattr(model, name, module)
+    return model
@@ -0,0 +1,156 @@
+import io
+from collections import defaultdict
+from typing import Dict, Optional, List, Any
+
+import numpy as np
+import torch
+import torch.nn as nn
+from allennlp.data import Vocabulary
+from allennlp.nn import util
+from overrides import overrides
+from scipy.sparse import csr_matrix, issparse, vstack
+
+from cyber.models.bag_of_words import bag_of_words
+from cyber.models.document_classifier import DocumentClassifier
+
+
+def dump_estimator(estimator) -> Dict[str, Any]:
+    """
+    Returns the hyperparameters and fitted attributes of a scikit-learn estimator (e.g., the support vectors, dual
+    coefficients and intercepts of an SVM). All numeric arrays are packed into one compressed npz blob, keeping
+    sparse ones (such as the support vectors of an SVM fit on bag-of-words features) sparse.
+    """
+    params = estimator.get_params()
+    arrays = {}
+    attributes = {}
+    for name, value in vars(estimator).items():
+        if name in params:
+            continue
+        if issparse(value):
+            value = value.tocsr()
+            arrays.update({name + ".data": value.data, name + ".indices": value.indices,
+                           name + ".indptr": value.indptr, name + ".shape": np.array(value.shape)})
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            arrays[name] = value
+        else:
+            attributes[name] = value
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return dict(params=params, attributes=attributes, arrays=buffer.getvalue())
+
+
+def load_estimator(estimator, state: Dict[str, Any]):
+    """
+    Restores the output of ``dump_estimator`` into ``estimator``, which is then ready to predict.
+    """
+    estimator.set_params(**state["params"])
+    for name, value in state["attributes"].items():
+        setattr(estimator, name, value)
+    sparse = defaultdict(dict)
+    with np.load(io.BytesIO(state["arrays"])) as arrays:
+        for key in arrays.files:
+            name, _, part = key.partition(".")
+            if part:
+                sparse[name][part] = arrays[key]
+            else:
+                setattr(estimator, name, arrays[key])
+    for name, parts in sparse.items():
+        setattr(estimator, name, csr_matrix((parts["data"], parts["indices"], parts["indptr"]),
+                                            shape=tuple(parts["shape"])))
+    return estimator
+
+
+class SklearnClassifier(DocumentClassifier):
+    """
+    Base class for models wrapping a scikit-learn ``estimator`` over bag-of-words features.
+
+    In training mode, ``forward`` only accumulates the features and labels of each batch, and the estimator
+    is fit once on all of them when the model is switched to evaluation mode (``model.eval()``, which the
+    trainer calls before validation and testing) or when its state is saved.
+    In evaluation mode, ``forward`` only predicts.
+    If ``incremental`` is true, the estimator is instead updated with ``partial_fit`` on every training batch,
+    so that training streams over the data without accumulating it.
+
+    Subclasses implement ``predict_scores``, returning a ``(batch_size, num_classes)`` tensor which is used
+    for the metrics and returned under ``output_key``.
+
+    The state dict holds the fitted estimator (see ``dump_estimator``), so archives can predict without refitting.
+    """
+    output_key = "scores"
+
+    def __init__(self, vocab: Vocabulary, estimator, incremental: bool = False) -> None:
+        super(SklearnClassifier, self).__init__(vocab)
+
+        self.vocab_size = self.vocab.get_vocab_size("tokens")
+        self.num_classes = self.vocab.get_vocab_size("labels")
+        self.estimator = estimator
+        self.incremental = incremental
+        self._features: List[csr_matrix] = []
+        self._labels: List[np.ndarray] = []
+        # noinspection PyCallingNonCallable
+        self.dummy = nn.Parameter(torch.tensor(0.0))
+
+    def is_fitted(self) -> bool:
+        return hasattr(self.estimator, "classes_")
+
+    def fit(self) -> None:
+        """
+        Fits the estimator on the features accumulated since the last fit, if there are any.
+        """
+        if self._features:
+            self._fit(vstack(self._features, format="csr"), np.concatenate(self._labels))
+            self._features.clear()
+            self._labels.clear()
+
+    def _fit(self, features: csr_matrix, labels: np.ndarray) -> None:
+        self.estimator.fit(features, labels)
+
+    def _partial_fit(self, features: csr_matrix, labels: np.ndarray) -> None:
+        self.estimator.partial_fit(features, labels, classes=list(range(self.num_classes)))
+
+    def predict_scores(self, bow: csr_matrix) -> torch.Tensor:
+        raise NotImplementedError()
+
+    def state_dict(self, *args, **kwargs):
+        del args, kwargs
+        self.fit()
+        return dump_estimator(self.estimator)
+
+    def _load_from_state_dict(self, state_dict, *args, **kwargs):
+        del args, kwargs
+        load_estimator(self.estimator, state_dict)
+
+    @overrides
+    def train(self, mode: bool = True):
+        if not mode:
+            self.fit()
+        return super(SklearnClassifier, self).train(mode)
+
+    @overrides
+    def forward(self, text: Dict[str, torch.LongTensor],
+                label: torch.LongTensor = None,
+                metadata: Optional[List[Dict[str, Any]]] = None) -> Dict[str, torch.Tensor]:
+        text_mask = util.get_text_field_mask(text).cpu().numpy()
+        tokens = text["tokens"].cpu().numpy()
+        bow = bag_of_words(tokens, text_mask, self.vocab_size)
+        if self.training and label is not None:
+            if self.incremental:
+                self._partial_fit(bow, label.cpu().numpy())
+            else:
+                self._features.append(bow)
+                self._labels.append(label.cpu().numpy())
+        elif not self.is_fitted():
+            raise RuntimeError("%s must be trained before it can predict" % type(self).__name__)
+
+        output_dict = {}
+        if self.is_fitted():
+            scores = self.predict_scores(bow)
+            output_dict[self.output_key] = scores
+            if label is not None:
+                for metric in self.metrics.values():
+                    metric(scores, label)
+                output_dict["loss"] = scores.argmax(-1).eq(label.cpu()).float().mean() + self.dummy
+        elif label is not None:  # Nothing to predict with before the first fit
+            output_dict["loss"] = 0 * self.dummy
+
+        return output_dict
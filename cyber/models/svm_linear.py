@@ -1,14 +1,41 @@
+from allennlp.common.checks import ConfigurationError
 from allennlp.data import Vocabulary
 from allennlp.models.model import Model
-from sklearn.svm import SVC
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC, LinearSVC
 
 from cyber.models.svm import Svm
 
+SOLVERS = ("libsvm", "liblinear", "sgd")
+
 
 @Model.register("svm_linear")
 class SvmLinear(Svm):
+    """
+    A linear SVM over bag-of-words features.
 
-    def __init__(self, vocab: Vocabulary) -> None:
-        super(Svm, self).__init__(vocab)
-        self.svm = SVC(kernel="linear", gamma='scale', cache_size=4000, max_iter=-1)
+    Parameters
+    ----------
+    vocab : ``Vocabulary``, required
+        A Vocabulary, required in order to compute the number of features and classes.
+    solver : ``str``, optional (default=``"libsvm"``)
+        ``"libsvm"`` uses the kernelized solver (``SVC(kernel="linear")``), whose training time grows at least
+        quadratically with the number of documents.
+        ``"liblinear"`` solves the primal problem (``LinearSVC``), fitting once on all training batches in time
+        linear in the number of documents.
+        ``"sgd"`` minimizes the hinge loss by stochastic gradient descent (``SGDClassifier``), updating the
+        model on each training batch without keeping the features in memory; every trainer epoch is one pass.
+    alpha : ``float``, optional (default=``1e-4``)
+        Regularization strength for the ``"sgd"`` solver.
+    """
 
+    def __init__(self, vocab: Vocabulary, solver: str = "libsvm", alpha: float = 1e-4) -> None:
+        if solver == "libsvm":
+            estimator = SVC(kernel="linear", gamma='scale', cache_size=4000, max_iter=-1)
+        elif solver == "liblinear":
+            estimator = LinearSVC(tol=1e-5)
+        elif solver == "sgd":
+            estimator = SGDClassifier(loss="hinge", alpha=alpha)
+        else:
+            raise ConfigurationError("Unknown solver '%s', must be one of: %s" % (solver, ", ".join(SOLVERS)))
+        super(Svm, self).__init__(vocab, estimator, incremental=solver == "sgd")
@@ -0,0 +1,43 @@
+import torch
+from allennlp.nn import util
+from torch.utils.checkpoint import checkpoint
+
+
+def _attend(queries: torch.Tensor, keys: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
+    weights = util.masked_softmax(queries.bmm(keys.permute(0, 2, 1).contiguous()), mask)
+    return util.weighted_sum(keys, weights)
+
+
+def blockwise_self_attention(encoded_tokens: torch.Tensor, mask: torch.Tensor, block_size: int) -> torch.Tensor:
+    """
+    Returns the same as ``util.weighted_sum(encoded_tokens, util.masked_softmax(logits, mask))`` with
+    ``logits = encoded_tokens.bmm(encoded_tokens.permute(0, 2, 1))``, the dot-product self-attention of
+    ``AttentionClassifier``, but attending with ``block_size`` queries (tokens) at a time. Since the softmax is
+    over the keys, each block is exact, and at most a ``(batch_size, block_size, num_tokens)`` slice of the
+    attention matrix exists at a time.
+
+    When gradients are needed, each block is checkpointed, so that its slice is recomputed in the backward pass
+    rather than kept from the forward pass.
+
+    Parameters
+    ----------
+    encoded_tokens : ``torch.Tensor``, required
+        Shape ``(batch_size, num_tokens, dim)``.
+    mask : ``torch.Tensor``, required
+        Shape ``(batch_size, num_tokens)``.
+    block_size : ``int``, required
+        Number of queries to attend with at a time.
+
+    Returns
+    -------
+    A tensor of shape ``(batch_size, num_tokens, dim)``.
+    """
+    use_checkpoint = torch.is_grad_enabled() and encoded_tokens.requires_grad
+    blocks = []
+    for start in range(0, encoded_tokens.size(1), block_size):
+        queries = encoded_tokens[:, start:start + block_size]
+        if use_checkpoint:
+            blocks.append(checkpoint(_attend, queries, encoded_tokens, mask))
+        else:
+            blocks.append(_attend(queries, encoded_tokens, mask))
+    return torch.cat(blocks, 1)
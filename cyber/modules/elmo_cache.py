@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from allennlp.common.checks import ConfigurationError
+from allennlp.modules import Elmo
+from allennlp.nn.util import remove_sentence_boundaries
+
+
+class ElmoActivationCache:
+    """
+    An on-disk cache of the biLM activations of a frozen ``Elmo``, so that the character CNN and biLM run once per
+    document rather than once per epoch. The activations of every layer are stored before the scalar mixes, which
+    are trained, and the mixes, boundary removal and dropout are applied on every batch as in ``Elmo.forward``.
+
+    Each document is keyed by the SHA-1 of its (unpadded) character ids. Its activations, of shape
+    ``(num_layers, num_tokens + 2, dim)``, are appended as ``float16`` to ``activations.f16``, which is
+    memory-mapped for reading, and then indexed by a line of ``key, offset, num_tokens + 2`` in ``index.tsv``.
+    The number of layers, their dimension and a checksum of the biLM weights are kept in ``meta.json``, so a
+    directory can only be used with the ELMo model it was filled by.
+
+    The biLM is stateful: its initial state for a batch is the final state of the previous one, so a document's
+    cached activations are those from the first batch it was seen in, and may differ slightly from those that
+    would be computed along with another batch.
+    """
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._data_path = os.path.join(directory, "activations.f16")
+        self._index_path = os.path.join(directory, "index.tsv")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._meta = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                self._meta = json.load(f)
+        self._index: Dict[str, Tuple[int, int]] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) == 3:  # skip a line left incomplete by an interrupted run
+                        self._index[fields[0]] = (int(fields[1]), int(fields[2]))
+        self._data: Optional[np.memmap] = None
+        self._checked = False
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @staticmethod
+    def _checksum(elmo: Elmo) -> str:
+        checksum = hashlib.sha1()
+        # noinspection PyProtectedMember
+        for name, tensor in sorted(elmo._elmo_lstm.state_dict().items()):  # pylint: disable=protected-access
+            checksum.update(name.encode("utf-8"))
+            checksum.update(tensor.detach().cpu().numpy().tobytes())
+        return checksum.hexdigest()
+
+    def _check(self, elmo: Elmo) -> None:
+        bilm = elmo._elmo_lstm  # pylint: disable=protected-access
+        if any(parameter.requires_grad for parameter in bilm.parameters()):
+            raise ConfigurationError("ELMo activations can only be cached if the biLM is not fine-tuned: "
+                                     "set 'requires_grad' to false or do not set 'elmo_cache_directory'.")
+        meta = {"num_layers": bilm.num_layers, "dim": bilm.get_output_dim(), "checksum": self._checksum(elmo)}
+        if self._meta is None:
+            with open(self._meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            self._meta = meta
+        elif self._meta != meta:
+            raise ConfigurationError("'%s' holds the activations of a different ELMo model" % self._directory)
+        self._checked = True
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Returns the cached activations of a document, of shape ``(num_layers, num_tokens + 2, dim)``, or None.
+        """
+        if key not in self._index:
+            return None
+        offset, length = self._index[key]
+        size = self._meta["num_layers"] * length * self._meta["dim"]
+        if self._data is None or offset + size > len(self._data):  # reopen after appending
+            self._data = np.memmap(self._data_path, dtype=np.float16, mode="r")
+        return self._data[offset:offset + size].reshape(self._meta["num_layers"], length, self._meta["dim"])
+
+    def put(self, key: str, activations: np.ndarray) -> None:
+        activations = np.ascontiguousarray(activations, dtype=np.float16)
+        with open(self._data_path, "ab") as f:
+            offset = f.tell() // 2  # in float16 elements
+            f.write(activations.tobytes())
+        with open(self._index_path, "a", encoding="utf-8") as f:
+            f.write("%s\t%d\t%d\n" % (key, offset, activations.shape[1]))
+        self._index[key] = (offset, activations.shape[1])
+
+    def activations(self, elmo: Elmo, inputs: torch.Tensor) -> Tuple[List[torch.Tensor], torch.Tensor]:
+        """
+        Returns what ``elmo._elmo_lstm(inputs)`` does, the activations of each layer of shape
+        ``(batch_size, timesteps + 2, dim)`` and the mask with sentence boundaries, running the biLM only on
+        documents that are not cached yet.
+        """
+        batch_size, timesteps = inputs.shape[:2]
+        lengths = ((inputs > 0).long().sum(-1) > 0).long().sum(-1).tolist()
+        character_ids = inputs.cpu().numpy()
+        keys = [hashlib.sha1(character_ids[i, :length].tobytes()).hexdigest() for i, length in enumerate(lengths)]
+        if not self._checked:
+            self._check(elmo)
+        cached = [self.get(key) for key in keys]
+        misses = [i for i, activations in enumerate(cached) if activations is None]
+        if misses:
+            with torch.no_grad():
+                # noinspection PyProtectedMember
+                bilm_output = elmo._elmo_lstm(inputs[misses, :max(lengths[i] for i in misses)])
+            computed = torch.stack(bilm_output["activations"]).cpu().numpy().astype(np.float16)
+            for j, i in enumerate(misses):
+                if keys[i] not in self._index:  # the same document may appear twice in a batch
+                    self.put(keys[i], computed[:, j, :lengths[i] + 2])
+                cached[i] = computed[:, j, :lengths[i] + 2]
+        layer_activations = inputs.new_zeros((self._meta["num_layers"], batch_size, timesteps + 2, self._meta["dim"]),
+                                             dtype=torch.float)
+        mask = inputs.new_zeros((batch_size, timesteps + 2), dtype=torch.long)
+        for i, length in enumerate(lengths):
+            layer_activations[:, i, :length + 2] = torch.from_numpy(np.array(cached[i], dtype=np.float32))
+            mask[i, :length + 2] = 1
+        return list(layer_activations), mask
+
+    def __call__(self, elmo: Elmo, inputs: torch.Tensor) -> Dict[str, Union[torch.Tensor, List[torch.Tensor]]]:
+        """
+        Returns the same as ``elmo(inputs)``, with the biLM activations taken from the cache.
+        """
+        layer_activations, mask_with_bos_eos = self.activations(elmo, inputs)
+        representations = []
+        mask = mask_with_bos_eos
+        # noinspection PyProtectedMember
+        for i in range(len(elmo._scalar_mixes)):  # pylint: disable=protected-access
+            representation = getattr(elmo, "scalar_mix_{}".format(i))(layer_activations, mask_with_bos_eos)
+            # noinspection PyProtectedMember
+            if not elmo._keep_sentence_boundaries:  # pylint: disable=protected-access
+                representation, mask = remove_sentence_boundaries(representation, mask_with_bos_eos)
+            # noinspection PyProtectedMember
+            representations.append(elmo._dropout(representation))  # pylint: disable=protected-access
+        return {"elmo_representations": representations, "mask": mask}
@@ -0,0 +1,44 @@
+from typing import Tuple
+
+import torch
+import torch.nn.functional as F
+
+
+class MaskedPooling(torch.nn.Module):
+    """
+    The max, min, mean and self-attentive pooling of ``AttentionClassifier``, in one module that can be compiled
+    with ``torch.jit.script``. Rather than two masked copies of the encodings, with padding replaced by ``-1e7``
+    for the max and ``+1e7`` for the min, one copy is made with padding shifted by ``-1e7`` and then shifted in
+    place by ``+2e7``. The mean and the masked softmax are computed as by ``torch.sum`` and
+    ``util.masked_softmax``.
+
+    The projection of the self-attentive pooling is left to the caller, so that its parameters keep their names.
+    """
+    def forward(self,  # pylint: disable=arguments-differ
+                encodings: torch.Tensor,
+                mask: torch.Tensor,
+                attention_logits: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Parameters
+        ----------
+        encodings : ``torch.Tensor``, required
+            Shape ``(batch_size, num_tokens, dim)``, zero where masked.
+        mask : ``torch.Tensor``, required
+            Shape ``(batch_size, num_tokens)``, as a float tensor.
+        attention_logits : ``torch.Tensor``, required
+            Shape ``(batch_size, num_tokens)``, the self-attentive pooling logits.
+
+        Returns
+        -------
+        The concatenated max, min, mean and self-attentive pools, of shape ``(batch_size, 4 * dim)``, and the
+        self-attentive pooling weights, of shape ``(batch_size, num_tokens)``.
+        """
+        penalty = (1.0 - mask.unsqueeze(2)) * 1e7
+        shifted_encodings = encodings - penalty
+        max_pool = shifted_encodings.max(1)[0]
+        min_pool = shifted_encodings.add_(2.0 * penalty).min(1)[0]  # the max needs only its indices for backward
+        mean_pool = encodings.sum(1) / mask.sum(1, keepdim=True)
+        self_weights = F.softmax(attention_logits * mask, dim=-1) * mask
+        self_weights = self_weights / (self_weights.sum(-1, keepdim=True) + 1e-13)
+        self_attentive_pool = self_weights.unsqueeze(1).bmm(encodings).squeeze(1)
+        return torch.cat([max_pool, min_pool, mean_pool, self_attentive_pool], 1), self_weights
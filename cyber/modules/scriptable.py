@@ -0,0 +1,135 @@
+"""
+Pure PyTorch versions of the tensor part of the document classifiers, for inference only, which
+``torch.jit.script`` can compile and which then run without AllenNLP (see ``cyber.predictors.export``).
+Each takes a ``(batch_size, num_tokens)`` tensor of token indices, with padding as ``0``, and returns the class
+probabilities. They require PyTorch 1.2 or later, which ``cyber.predictors.export`` checks.
+"""
+import torch
+import torch.nn.functional as F
+from torch import nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+
+from cyber.modules.masked_pooling import MaskedPooling
+
+
+def _masked_softmax(vector: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
+    """
+    ``allennlp.nn.util.masked_softmax``, for a mask of one dimension less than ``vector`` or of the same.
+    """
+    while mask.dim() < vector.dim():
+        mask = mask.unsqueeze(1)
+    result = F.softmax(vector * mask, dim=-1) * mask
+    return result / (result.sum(dim=-1, keepdim=True) + 1e-13)
+
+
+class LstmSeq2Seq(nn.Module):
+    """
+    A batch-first LSTM over padded sequences, returning zeros at padding, as ``PytorchSeq2SeqWrapper`` does.
+    """
+    def __init__(self, lstm: nn.LSTM) -> None:
+        super().__init__()
+        self.lstm = lstm
+
+    def forward(self, inputs: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        lengths = mask.long().sum(1)
+        packed = pack_padded_sequence(inputs, lengths.clamp(min=1).cpu(), batch_first=True, enforce_sorted=False)
+        outputs, _ = pad_packed_sequence(self.lstm(packed)[0], batch_first=True, total_length=inputs.size(1))
+        return outputs * (lengths > 0).to(outputs.dtype).view(-1, 1, 1)
+
+
+class LstmSeq2Vec(nn.Module):
+    """
+    The final state of the top layer of a batch-first LSTM, in both directions if bidirectional, as
+    ``PytorchSeq2VecWrapper`` returns.
+    """
+    def __init__(self, lstm: nn.LSTM) -> None:
+        super().__init__()
+        self.lstm = lstm
+        self.num_directions = 2 if lstm.bidirectional else 1
+
+    def forward(self, inputs: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        lengths = mask.long().sum(1)
+        packed = pack_padded_sequence(inputs, lengths.clamp(min=1).cpu(), batch_first=True, enforce_sorted=False)
+        state = self.lstm(packed)[1][0][-self.num_directions:]  # (num_directions, batch_size, hidden_size)
+        state = state.transpose(0, 1).contiguous().view(inputs.size(0), -1)
+        return state * (lengths > 0).to(state.dtype).unsqueeze(1)
+
+
+class BagOfEmbeddings(nn.Module):
+    """
+    The sum, or average, of the embeddings, as ``BagOfEmbeddingsEncoder`` computes it.
+    """
+    def __init__(self, averaged: bool = False) -> None:
+        super().__init__()
+        self.averaged = averaged
+
+    def forward(self, inputs: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        summed = (inputs * mask.unsqueeze(-1).to(inputs.dtype)).sum(1)
+        if self.averaged:
+            lengths = mask.long().sum(1)
+            summed = summed / lengths.clamp(min=1).unsqueeze(-1).to(summed.dtype)
+            summed = summed * (lengths > 0).to(summed.dtype).unsqueeze(-1)
+        return summed
+
+
+class MaxoutPool(nn.Module):
+    """
+    The max over each group of ``pool_size`` consecutive outputs of a ``Maxout`` layer.
+    """
+    def __init__(self, pool_size: int) -> None:
+        super().__init__()
+        self.pool_size = pool_size
+
+    def forward(self, inputs: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        return inputs.view(inputs.size(0), -1, self.pool_size).max(-1)[0]
+
+
+class Seq2VecClassifierModule(nn.Module):
+    """
+    ``Seq2VecClassifier``: embedding, encoder (``LstmSeq2Vec`` or ``BagOfEmbeddings``) and feedforward layers.
+    """
+    def __init__(self, embedding: torch.Tensor, encoder: nn.Module, output_layer: nn.Sequential) -> None:
+        super().__init__()
+        self.embedding = nn.Parameter(embedding, requires_grad=False)
+        self.encoder = encoder
+        self.output_layer = output_layer
+
+    def forward(self, token_ids: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        mask = (token_ids != 0).float()
+        encoded_text = self.encoder(F.embedding(token_ids, self.embedding), mask)
+        return F.softmax(self.output_layer(encoded_text), dim=-1)
+
+
+class AttentionClassifierModule(nn.Module):
+    """
+    ``AttentionClassifier`` without ELMo: embedding, feedforward, encoder, biattention, integrator, pooling and
+    maxout layers.
+    """
+    def __init__(self,
+                 embedding: torch.Tensor,
+                 pre_encode_feedforward: nn.Sequential,
+                 encoder: LstmSeq2Seq,
+                 integrator: LstmSeq2Seq,
+                 self_attentive_pooling_projection: nn.Linear,
+                 output_layer: nn.Sequential) -> None:
+        super().__init__()
+        self.embedding = nn.Parameter(embedding, requires_grad=False)
+        self.pre_encode_feedforward = pre_encode_feedforward
+        self.encoder = encoder
+        self.integrator = integrator
+        self.self_attentive_pooling_projection = self_attentive_pooling_projection
+        self.pooling = MaskedPooling()
+        self.output_layer = output_layer
+
+    def forward(self, token_ids: torch.Tensor) -> torch.Tensor:  # pylint: disable=arguments-differ
+        mask = (token_ids != 0).float()
+        embedded_text = F.embedding(token_ids, self.embedding)
+        encoded_tokens = self.encoder(self.pre_encode_feedforward(embedded_text), mask)
+        attention_weights = _masked_softmax(encoded_tokens.bmm(encoded_tokens.transpose(1, 2)), mask)
+        encoded_text = attention_weights.bmm(encoded_tokens)
+        integrated_encodings = self.integrator(torch.cat([encoded_tokens,
+                                                          encoded_tokens - encoded_text,
+                                                          encoded_tokens * encoded_text], 2), mask)
+        self_attentive_logits = self.self_attentive_pooling_projection(integrated_encodings).squeeze(2)
+        pooled_representations, _ = self.pooling(integrated_encodings, mask, self_attentive_logits)
+        return F.softmax(self.output_layer(pooled_representations), dim=-1)
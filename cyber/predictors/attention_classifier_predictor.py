@@ -1,5 +1,6 @@
 from allennlp.common.util import JsonDict
-from allennlp.data import Instance
+from allennlp.data import DatasetReader, Instance
+from allennlp.models import Model
 from allennlp.predictors.predictor import Predictor
 from overrides import overrides
 
@@ -10,4 +11,20 @@ class AttentionClassifierPredictor(Predictor):
 
     @overrides
     def _json_to_instance(self, json_dict: JsonDict) -> Instance:
-        return self._dataset_reader.text_to_instance(text=json_dict['text_input'])
+        # Keep the original token strings for display, rather than their vocabulary entries
+        return self._dataset_reader.text_to_instance(text=json_dict['text_input'], token_metadata=True)
+
+
+@Predictor.register('attention_classifier_light')
+class AttentionClassifierLightPredictor(Predictor):
+    """
+    Predictor for the AttentionClassifier that only outputs labels and probabilities: it turns off the model's
+    ``output_attention``, so the attention weights are neither returned nor accumulated in the attention metric.
+    """
+    def __init__(self, model: Model, dataset_reader: DatasetReader) -> None:
+        super().__init__(model, dataset_reader)
+        model.output_attention = False
+
+    @overrides
+    def _json_to_instance(self, json_dict: JsonDict) -> Instance:
+        return self._dataset_reader.text_to_instance(text=json_dict['text_input'], token_metadata=False)
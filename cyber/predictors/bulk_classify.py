@@ -0,0 +1,165 @@
+"""
+Classify every document (line) in a set of files with a trained model, writing one JSON line per document.
+
+Usage: python -m cyber.predictors.bulk_classify MODEL.tar.gz INPUT [INPUT ...] -o OUTPUT.jsonl [--raw]
+           [--batch-size 64] [--window 10000] [--cuda-device -1] [--quantize]
+
+Inputs are files or directories (all of whose files are read, in sorted order). By default each non-empty line is a
+document, as in the output of ``clean_text``; with ``--raw``, files are cleaned on the fly first. Documents are
+read in windows of ``--window``, sorted by length within each window so that batches need little padding, and
+written in input order. After each window, the position reached is saved to ``OUTPUT.jsonl.progress``: if the job
+is stopped, running the same command again truncates the output to the last checkpoint and resumes from there.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from allennlp.common.util import import_submodules
+from allennlp.data import DatasetReader
+from allennlp.models.archival import load_archive
+from allennlp.predictors.predictor import Predictor
+
+from cyber.models.quantization import quantize
+from cyber.util.clean_text import clean_file
+
+
+def list_files(inputs):
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, filename) for filename in os.listdir(path))
+        else:
+            files.append(path)
+    return files
+
+
+def read_lines(path, raw=False):
+    if raw:
+        yield from clean_file(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield line.strip()
+
+
+def iter_documents(files, raw=False, file_index=0, line_index=0):
+    """
+    Yields ``(file index, line index, text)`` for every document, starting from the given position.
+    """
+    for i in range(file_index, len(files)):
+        skip = line_index if i == file_index else 0
+        for j, text in enumerate(islice(read_lines(files[i], raw), skip, None), start=skip):
+            if text:
+                yield i, j, text
+
+
+class Checkpoint:
+    """
+    The position of the next document to classify and the size of the output up to it, saved atomically as JSON.
+    """
+    def __init__(self, path, files):
+        self.path = path
+        self.files_hash = hashlib.sha1("\n".join(files).encode("utf-8")).hexdigest()
+        self.state = {"files": self.files_hash, "file_index": 0, "line_index": 0, "documents": 0, "output_bytes": 0}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state["files"] != self.files_hash:
+                raise ValueError("'%s' is the progress of a different list of inputs; remove it to start over" % path)
+            self.state = state
+
+    def save(self, file_index, line_index, documents, output_bytes):
+        self.state.update(file_index=file_index, line_index=line_index, documents=documents,
+                          output_bytes=output_bytes)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_predictor(archive_path, cuda_device=-1, quantized=False):
+    """
+    Returns a predictor for the archived model, with attention outputs turned off (and int8 quantization applied,
+    if ``quantized``), its dataset reader, and the list of labels.
+    """
+    archive = load_archive(archive_path, cuda_device=cuda_device)
+    model = archive.model
+    model.eval()
+    if quantized:
+        quantize(model)
+    if hasattr(model, "output_attention"):  # only labels and probabilities are written
+        model.output_attention = False
+    reader = DatasetReader.from_params(archive.config["dataset_reader"].duplicate())
+    labels = [label for _, label in sorted(model.vocab.get_index_to_token_vocabulary("labels").items())]
+    return Predictor(model, reader), reader, labels
+
+
+def to_json(file_path, line_index, output, labels):
+    result = {"file": file_path, "line": line_index, "label": output.get("label")}
+    if "class_probabilities" in output:
+        result["probabilities"] = dict(zip(labels, output["class_probabilities"]))
+    return json.dumps(result)
+
+
+def classify(predictor, reader, window, batch_size):
+    """
+    Returns the output for each document in the window, predicted in batches sorted by length.
+    """
+    order = sorted(range(len(window)), key=lambda k: len(window[k][2]))
+    outputs = [None] * len(window)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        instances = [reader.text_to_instance(window[k][2]) for k in batch]
+        for k, output in zip(batch, predictor.predict_batch_instance(instances)):
+            outputs[k] = output
+    return outputs
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("inputs", nargs="+", help="files or directories of documents, one per line")
+    argparser.add_argument("-o", "--output", required=True, help="JSONL file to write")
+    argparser.add_argument("--raw", action="store_true", help="clean the inputs with clean_text first")
+    argparser.add_argument("--batch-size", type=int, default=64)
+    argparser.add_argument("--window", type=int, default=10000, help="documents to sort by length and checkpoint")
+    argparser.add_argument("--cuda-device", type=int, default=-1)
+    argparser.add_argument("--quantize", action="store_true", help="apply dynamic int8 quantization (CPU only)")
+    argparser.add_argument("--include-package", action="append", default=["cyber"])
+    args = argparser.parse_args()
+    for package in args.include_package:
+        import_submodules(package)
+    predictor, reader, labels = load_predictor(args.archive_path, args.cuda_device, args.quantize)
+
+    files = list_files(args.inputs)
+    checkpoint = Checkpoint(args.output + ".progress", files)
+    state = checkpoint.state
+    documents = iter_documents(files, args.raw, state["file_index"], state["line_index"])
+    num_documents = resumed = state["documents"]
+    if resumed:
+        print("Resuming after %d documents" % resumed, file=sys.stderr)
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.truncate(state["output_bytes"])
+        while True:
+            window = list(islice(documents, args.window))
+            if not window:
+                break
+            for (i, j, _), output in zip(window, classify(predictor, reader, window, args.batch_size)):
+                print(to_json(files[i], j, output, labels), file=f)
+            f.flush()
+            os.fsync(f.fileno())
+            num_documents += len(window)
+            i, j, _ = window[-1]
+            checkpoint.save(i, j + 1, num_documents, f.tell())
+            print("Classified %d documents (%.1f documents/sec)" % (
+                num_documents, (num_documents - resumed) / (time.perf_counter() - start)),
+                file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
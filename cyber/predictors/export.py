@@ -0,0 +1,197 @@
+"""
+Export a trained ``seq2vec_classifier`` or ``attention_classifier`` as a TorchScript module and a vocabulary file,
+which ``serving.runtime`` runs (tokenize, index, predict) without importing AllenNLP.
+
+Usage: python -m cyber.predictors.export MODEL.tar.gz OUTPUT_DIR [FILE] [--num-documents 100]
+
+Writes ``OUTPUT_DIR/model.pt``, compiled by ``torch.jit.script`` from the modules in ``cyber.modules.scriptable``,
+and ``OUTPUT_DIR/vocab.json``, with the token and label vocabularies and the tokenizer settings. The class
+probabilities of the exported module are compared with those of the archived model on the first documents of FILE
+(by default, the first file in ``data/test``).
+
+Only models whose dataset reader tokenizes with spaCy and indexes single token ids, and whose embedder is a single
+token embedding, can be exported; ELMo is not supported, since its character CNN and biLM are not rebuilt here.
+Exporting requires PyTorch 1.2 or later, for ``torch.jit.script`` of modules, ``nn.Identity`` and unsorted
+``pack_padded_sequence``.
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import re
+from itertools import islice
+
+import torch
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.util import import_submodules
+from allennlp.data import DatasetReader
+from allennlp.data.dataset import Batch
+from allennlp.data.token_indexers import SingleIdTokenIndexer
+from allennlp.data.tokenizers import WordTokenizer
+from allennlp.data.tokenizers.word_filter import PassThroughWordFilter
+from allennlp.data.tokenizers.word_splitter import SpacyWordSplitter
+from allennlp.data.tokenizers.word_stemmer import PassThroughWordStemmer
+from allennlp.models.archival import load_archive
+from allennlp.modules.seq2seq_encoders import PytorchSeq2SeqWrapper
+from allennlp.modules.seq2vec_encoders import BagOfEmbeddingsEncoder, PytorchSeq2VecWrapper
+from allennlp.modules.token_embedders import Embedding
+from torch import nn
+
+from cyber.models.attention_classifier import AttentionClassifier
+from cyber.models.seq2vec_classifier import Seq2VecClassifier
+from cyber.modules.scriptable import (AttentionClassifierModule, BagOfEmbeddings, LstmSeq2Seq, LstmSeq2Vec,
+                                      MaxoutPool, Seq2VecClassifierModule)
+
+
+def _activation(activation) -> nn.Module:
+    if isinstance(activation, nn.Module):
+        return copy.deepcopy(activation)
+    probe = torch.randn(2, 3)
+    if torch.equal(activation(probe), probe):  # "linear"
+        return nn.Identity()
+    raise ConfigurationError("Cannot export activation %r" % activation)
+
+
+# noinspection PyProtectedMember
+def _feedforward(feedforward) -> nn.Sequential:
+    layers = []
+    for linear, activation in zip(feedforward._linear_layers, feedforward._activations):
+        layers += [copy.deepcopy(linear), _activation(activation)]
+    return nn.Sequential(*layers)
+
+
+# noinspection PyProtectedMember
+def _maxout(maxout) -> nn.Sequential:
+    layers = []
+    for linear, pool_size in zip(maxout._linear_layers, maxout._pool_sizes):
+        layers += [copy.deepcopy(linear), MaxoutPool(pool_size)]
+    return nn.Sequential(*layers)
+
+
+# noinspection PyProtectedMember
+def _embedding(text_field_embedder) -> torch.Tensor:
+    token_embedders = text_field_embedder._token_embedders
+    embedding = token_embedders.get("tokens")
+    if set(token_embedders) != {"tokens"} or not isinstance(embedding, Embedding) or \
+            embedding._projection is not None or embedding.max_norm is not None:
+        raise ConfigurationError("Only a single 'tokens' embedding, without projection or max_norm, can be exported")
+    return embedding.weight.detach().clone()
+
+
+# noinspection PyProtectedMember
+def _lstm(encoder) -> nn.LSTM:
+    if not isinstance(encoder, (PytorchSeq2SeqWrapper, PytorchSeq2VecWrapper)) or \
+            not isinstance(encoder._module, nn.LSTM):
+        raise ConfigurationError("Only LSTM encoders can be exported, but got %s" % type(encoder).__name__)
+    return copy.deepcopy(encoder._module)
+
+
+# noinspection PyProtectedMember
+def scriptable_module(model) -> nn.Module:
+    """
+    Returns a ``cyber.modules.scriptable`` module in evaluation mode with (copies of) the weights of ``model``.
+    """
+    if isinstance(model, Seq2VecClassifier):
+        encoder = model.internal_text_encoder
+        module = Seq2VecClassifierModule(
+                _embedding(model.model_text_field_embedder),
+                BagOfEmbeddings(encoder._averaged) if isinstance(encoder, BagOfEmbeddingsEncoder)
+                else LstmSeq2Vec(_lstm(encoder)),
+                _feedforward(model.output_layer))
+    elif isinstance(model, AttentionClassifier):
+        if model._elmo is not None:
+            raise ConfigurationError("AttentionClassifier models with ELMo cannot be exported")
+        module = AttentionClassifierModule(
+                _embedding(model._text_field_embedder),
+                _feedforward(model._pre_encode_feedforward),
+                LstmSeq2Seq(_lstm(model._encoder)),
+                LstmSeq2Seq(_lstm(model._integrator)),
+                copy.deepcopy(model._self_attentive_pooling_projection),
+                _maxout(model._output_layer))
+    else:
+        raise ConfigurationError("Cannot export a %s" % type(model).__name__)
+    return module.eval()
+
+
+# noinspection PyProtectedMember
+def tokenizer_settings(reader) -> dict:
+    """
+    Returns the spaCy model and lowercasing the reader tokenizes and indexes with, if ``serving.runtime`` can
+    reproduce them.
+    """
+    tokenizer = getattr(reader, "_tokenizer", None)
+    indexers = getattr(reader, "_token_indexers", {})
+    indexer = indexers.get("tokens")
+    if not isinstance(tokenizer, WordTokenizer) or not isinstance(tokenizer._word_splitter, SpacyWordSplitter) or \
+            not isinstance(tokenizer._word_filter, PassThroughWordFilter) or \
+            not isinstance(tokenizer._word_stemmer, PassThroughWordStemmer) or \
+            tokenizer._start_tokens or tokenizer._end_tokens:
+        raise ConfigurationError("Only a WordTokenizer with the default spaCy word splitter can be exported")
+    if set(indexers) != {"tokens"} or not isinstance(indexer, SingleIdTokenIndexer) or \
+            indexer.namespace != "tokens" or indexer._start_tokens or indexer._end_tokens:
+        raise ConfigurationError("Only a single 'tokens' SingleIdTokenIndexer can be exported")
+    meta = tokenizer._word_splitter.spacy.meta
+    return {"spacy_model": "%s_%s" % (meta["lang"], meta["name"]), "lowercase_tokens": indexer.lowercase_tokens}
+
+
+def export(archive_path: str, output_dir: str):
+    """
+    Writes the exported module and vocabulary to ``output_dir``, and returns the archived model, its dataset
+    reader and the exported module.
+    """
+    major, minor = map(int, re.match(r"(\d+)\.(\d+)", torch.__version__).groups())
+    if (major, minor) < (1, 2):
+        raise ConfigurationError("Exporting to TorchScript requires PyTorch 1.2 or later, not %s" % torch.__version__)
+    archive = load_archive(archive_path)
+    model = archive.model
+    model.eval()
+    reader = DatasetReader.from_params(archive.config["dataset_reader"].duplicate())
+    vocab = model.vocab
+    settings = tokenizer_settings(reader)
+    module = torch.jit.script(scriptable_module(model))
+    os.makedirs(output_dir, exist_ok=True)
+    module.save(os.path.join(output_dir, "model.pt"))
+    # noinspection PyProtectedMember
+    settings.update(model=archive.config["model"]["type"],
+                    oov_index=vocab.get_token_index(vocab._oov_token, "tokens"),
+                    tokens=[token for _, token in sorted(vocab.get_index_to_token_vocabulary("tokens").items())],
+                    labels=[label for _, label in sorted(vocab.get_index_to_token_vocabulary("labels").items())])
+    with open(os.path.join(output_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(settings, f, ensure_ascii=False)
+    return model, reader, module
+
+
+def max_difference(model, reader, module, texts) -> float:
+    """
+    Returns the largest difference between the class probabilities of the archived model and the exported module.
+    """
+    batch = Batch([reader.text_to_instance(text) for text in texts])
+    batch.index_instances(model.vocab)
+    text = batch.as_tensor_dict()["text"]
+    with torch.no_grad():
+        expected = torch.softmax(model(text)["logits"], dim=-1)
+        return float((module(text["tokens"]) - expected).abs().max())
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("output_dir")
+    argparser.add_argument("file_path", nargs="?", default=next(iter(sorted(glob.glob("data/test/*.txt"))), None))
+    argparser.add_argument("--num-documents", type=int, default=100, help="documents to compare predictions on")
+    argparser.add_argument("--include-package", action="append", default=["cyber"])
+    args = argparser.parse_args()
+    for package in args.include_package:
+        import_submodules(package)
+    model, reader, module = export(args.archive_path, args.output_dir)
+    print("Exported to", args.output_dir)
+    if args.file_path:
+        with open(args.file_path, encoding="utf-8") as f:
+            texts = [line.strip() for line in islice(f, args.num_documents)]
+        print("Largest probability difference on %d documents: %.2g" % (
+            len(texts), max_difference(model, reader, module, texts)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Serve a predictor over HTTP, running concurrent requests through the model together in micro-batches.
+
+Usage: python -m cyber.predictors.micro_batching --archive-path MODEL.tar.gz [--predictor attention_classifier]
+           [--include-package cyber] [--port 8001] [--max-batch-size 32] [--max-wait 0.01] [--quantize]
+
+``POST /predict`` takes the same JSON as ``allennlp.service.server_simple`` (so the demo works with either), and
+``GET /stats`` returns latency percentiles, throughput and batch sizes over the most recent requests. Errors are
+returned as ``{"error": ...}``, with status 400 for invalid inputs and 500 if the batch fails to predict.
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import Any, Dict, List
+
+import numpy as np
+from allennlp.common.util import JsonDict, import_submodules, sanitize
+from allennlp.data import Instance
+from allennlp.models.archival import load_archive
+from allennlp.predictors.predictor import Predictor
+from flask import Flask, jsonify, request
+from flask_cors import CORS
+
+from cyber.models.quantization import quantize
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+PERCENTILES = (50, 90, 99)
+
+
+class InvalidRequestError(Exception):
+    """
+    Raised for a request whose inputs the predictor cannot convert to an instance.
+    """
+
+
+def _trim_attention(output: JsonDict, instance: Instance) -> JsonDict:
+    """
+    Removes the padding to the longest document in the batch from the attention weights of one document.
+    """
+    if "text" not in instance.fields:
+        return output
+    num_tokens = instance.fields["text"].sequence_length()
+    if "attention_weights" in output:
+        output["attention_weights"] = [row[:num_tokens] for row in output["attention_weights"][:num_tokens]]
+    if "self_weights" in output:
+        output["self_weights"] = output["self_weights"][:num_tokens]
+    return output
+
+
+class MicroBatcher:
+    """
+    Queues requests from any number of threads, and predicts them in batches on one worker thread with
+    ``Predictor.predict_batch_instance``. A batch is formed from the first waiting request and whatever others
+    arrive within ``max_wait`` seconds of it, up to ``max_batch_size``. A request whose inputs cannot be converted to
+    an instance fails on its own, with an ``InvalidRequestError``, without the rest of its batch.
+
+    Parameters
+    ----------
+    predictor : ``Predictor``, required
+        Used to convert the JSON inputs to instances and to predict them.
+    max_batch_size : ``int``, optional (default=``32``)
+    max_wait : ``float``, optional (default=``0.01``)
+        The longest time, in seconds, a request waits for others to batch with.
+    stats_window : ``int``, optional (default=``10000``)
+        Number of most recent requests to compute statistics over.
+    """
+    def __init__(self,
+                 predictor: Predictor,
+                 max_batch_size: int = 32,
+                 max_wait: float = 0.01,
+                 stats_window: int = 10000) -> None:
+        self._predictor = predictor
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue: Queue = Queue()
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=stats_window)  # (completion time, seconds since request)
+        self._batch_sizes: deque = deque(maxlen=stats_window)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def predict_json(self, inputs: JsonDict) -> JsonDict:
+        """
+        Blocks until the prediction for ``inputs`` is ready, and returns it.
+        """
+        future: Future = Future()
+        self._queue.put((time.perf_counter(), inputs, future))
+        return future.result()
+
+    def _next_batch(self) -> List[Any]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch, instances = [], []
+            for start, inputs, future in self._next_batch():
+                try:
+                    # noinspection PyProtectedMember
+                    instances.append(self._predictor._json_to_instance(inputs))
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning("Invalid request: %r", e)
+                    future.set_exception(InvalidRequestError("Invalid request: %r" % e))
+                else:
+                    batch.append((start, future))
+            if not batch:
+                continue
+            try:
+                outputs = self._predictor.predict_batch_instance(instances)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Failed to predict a batch of %d", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            with self._lock:
+                self._latencies.extend((now, now - start) for start, _ in batch)
+                self._batch_sizes.append(len(batch))
+            for (_, future), instance, output in zip(batch, instances, outputs):
+                future.set_result(_trim_attention(sanitize(output), instance))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the latency percentiles in milliseconds, the throughput in requests per second, and the mean
+        batch size, over the most recent requests.
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+        if not latencies:
+            return {"requests": 0}
+        completed, seconds = map(np.array, zip(*latencies))
+        stats = {"requests": len(latencies), "mean_batch_size": float(np.mean(batch_sizes)),
+                 "queued": self._queue.qsize()}
+        stats.update(("latency_p%d_ms" % p, 1000 * float(v)) for p, v in zip(PERCENTILES,
+                                                                            np.percentile(seconds, PERCENTILES)))
+        elapsed = float(completed.max() - (completed - seconds).min())
+        stats["requests_per_second"] = len(latencies) / elapsed if elapsed > 0 else float("inf")
+        return stats
+
+
+def make_app(batcher: MicroBatcher) -> Flask:
+    app = Flask(__name__)  # pylint: disable=invalid-name
+    CORS(app)
+
+    @app.route("/predict", methods=["POST", "OPTIONS"])
+    def predict():  # pylint: disable=unused-variable
+        if request.method == "OPTIONS":
+            return "", 200
+        try:
+            return jsonify(batcher.predict_json(request.get_json()))
+        except InvalidRequestError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:  # pylint: disable=broad-except
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/stats")
+    def stats():  # pylint: disable=unused-variable
+        return jsonify(batcher.stats())
+
+    return app
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--archive-path", required=True)
+    argparser.add_argument("--predictor", default="attention_classifier")
+    argparser.add_argument("--include-package", action="append", default=[])
+    argparser.add_argument("--cuda-device", type=int, default=-1)
+    argparser.add_argument("--port", type=int, default=8001)
+    argparser.add_argument("--max-batch-size", type=int, default=32)
+    argparser.add_argument("--max-wait", type=float, default=0.01, help="seconds to wait for a batch to fill")
+    argparser.add_argument("--quantize", action="store_true", help="apply dynamic int8 quantization (CPU only)")
+    args = argparser.parse_args()
+    for package in args.include_package:
+        import_submodules(package)
+    archive = load_archive(args.archive_path, cuda_device=args.cuda_device)
+    if args.quantize:
+        quantize(archive.model)
+    predictor = Predictor.from_archive(archive, args.predictor)
+    batcher = MicroBatcher(predictor, max_batch_size=args.max_batch_size, max_wait=args.max_wait)
+    make_app(batcher).run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
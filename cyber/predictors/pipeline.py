@@ -0,0 +1,123 @@
+"""
+Classify raw pages in one streaming pass: each file is read, cleaned, deduplicated, tokenized and classified in
+batches, with every stage running in its own thread and bounded queues between them, so that the stages overlap
+and no intermediate text is written to disk.
+
+Usage: python -m cyber.predictors.pipeline MODEL.tar.gz INPUT [INPUT ...] [-o OUTPUT.jsonl]
+           [--batch-size 64] [--queue-size 1000] [--keep-duplicates] [--cuda-device -1] [--quantize]
+
+Inputs are raw files or directories of them, as given to ``clean_text``. Writes one JSON line per clean document
+(line), as ``bulk_classify`` does, to standard output by default.
+"""
+import argparse
+import sys
+import threading
+from itertools import islice
+from queue import Queue
+
+from allennlp.common.util import import_submodules
+
+from cyber.predictors.bulk_classify import list_files, load_predictor, to_json
+from cyber.util.clean_text import clean_file
+from cyber.util.dedup import Deduplicator
+
+
+class _End:
+    def __init__(self, error=None):
+        self.error = error
+
+
+def threaded(iterable, queue_size=1000):
+    """
+    Iterates over ``iterable`` in a separate thread, which stays at most ``queue_size`` items ahead of the
+    consumer. Exceptions are raised in the consumer.
+    """
+    queue = Queue(queue_size)
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put(item)
+        except Exception as e:  # pylint: disable=broad-except
+            queue.put(_End(e))
+        else:
+            queue.put(_End())
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = queue.get()
+        if isinstance(item, _End):
+            if item.error is not None:
+                raise item.error
+            return
+        yield item
+
+
+def clean_documents(files):
+    for file_path in files:
+        for line_index, text in enumerate(clean_file(file_path)):
+            yield file_path, line_index, text
+
+
+def remove_duplicates(documents, deduplicator):
+    for document in documents:
+        if not deduplicator.is_duplicate(document[2]):
+            yield document
+
+
+def to_instances(documents, reader):
+    for document in documents:
+        yield document, reader.text_to_instance(document[2])
+
+
+def predict(documents, predictor, batch_size):
+    documents = iter(documents)
+    for batch in iter(lambda: list(islice(documents, batch_size)), []):
+        yield from zip((document for document, _ in batch),
+                       predictor.predict_batch_instance([instance for _, instance in batch]))
+
+
+def classify_pages(files, predictor, reader, batch_size=64, queue_size=1000, deduplicator=None):
+    """
+    Yields ``((file path, line index, text), output)`` for every clean document in the given raw files, skipping
+    duplicates of earlier documents if a ``Deduplicator`` is given. Each stage runs in its own thread.
+    """
+    documents = threaded(clean_documents(files), queue_size)
+    if deduplicator is not None:
+        documents = threaded(remove_duplicates(documents, deduplicator), queue_size)
+    instances = threaded(to_instances(documents, reader), queue_size)
+    return threaded(predict(instances, predictor, batch_size), queue_size)
+
+
+def write_results(results, labels, f):
+    for (file_path, line_index, _), output in results:
+        print(to_json(file_path, line_index, output, labels), file=f)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("archive_path")
+    argparser.add_argument("inputs", nargs="+", help="raw document files or directories")
+    argparser.add_argument("-o", "--output", help="JSONL file to write (default: standard output)")
+    argparser.add_argument("--batch-size", type=int, default=64)
+    argparser.add_argument("--queue-size", type=int, default=1000, help="maximum items waiting between stages")
+    argparser.add_argument("--keep-duplicates", action="store_true",
+                           help="classify documents that duplicate earlier ones (up to case and digits) too")
+    argparser.add_argument("--cuda-device", type=int, default=-1)
+    argparser.add_argument("--quantize", action="store_true", help="apply dynamic int8 quantization (CPU only)")
+    argparser.add_argument("--include-package", action="append", default=["cyber"])
+    args = argparser.parse_args()
+    for package in args.include_package:
+        import_submodules(package)
+    predictor, reader, labels = load_predictor(args.archive_path, args.cuda_device, args.quantize)
+    results = classify_pages(list_files(args.inputs), predictor, reader, batch_size=args.batch_size,
+                             queue_size=args.queue_size, deduplicator=None if args.keep_duplicates else Deduplicator())
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_results(results, labels, f)
+    else:
+        write_results(results, labels, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
-import contextlib
+import argparse
 import os
 import re
+import sys
+import time
+from functools import partial
 from itertools import groupby
+from multiprocessing import Pool
+from operator import methodcaller
 
 from unidecode import unidecode
 
@@ -12,6 +17,13 @@ STOP = (
 )
 
 
+LANG_REGEX = re.compile(r"## LANG (.*)")
+BUTTON_LIST_REGEX = re.compile(r"(.?\s*\[\d+\]\s*)+")
+ALPHABETIC_REGEX = re.compile(r"[a-zA-Z]")
+ENUMERATION_REGEX = re.compile(r".?\s*(\(\d+\)|\d+\.)")
+DIGIT_REGEX = re.compile(r"\d")
+
+
 def read_file(path):
     with open(path, "rb") as f:
         for line in f.read().decode("utf-8", errors="ignore").splitlines():
@@ -19,7 +31,7 @@ def read_file(path):
             # skip list of references or encryption keys at the end
             if line.startswith(('References', 'PGP')) or any(s in line for s in STOP):
                 break
-            m = re.match(r"## LANG (.*)", line)  # skip non-english documents
+            m = LANG_REGEX.match(line)  # skip non-english documents
             if m:
                 lang = m.group(1)
                 if lang != "en":
@@ -29,10 +41,10 @@ def read_file(path):
 
 
 def new_line(s):
-    if re.match(r"(.?\s*\[\d+\]\s*)+", s) or \
-            not re.search(r"[a-zA-Z]", s.replace("GMT", "")):  # button list or non alphabetic
+    if BUTTON_LIST_REGEX.match(s) or \
+            not ALPHABETIC_REGEX.search(s.replace("GMT", "")):  # button list or non alphabetic
         return None
-    m = re.match(r".?\s*(\(\d+\)|\d+\.)", s)
+    m = ENUMERATION_REGEX.match(s)
     if m:
         return m.group(1)  # other enumerated list
     return bool(s)
@@ -60,29 +72,65 @@ DELETE_PATTERN3 = (
 )
 
 
+def _alternation(patterns):
+    return "|".join("(?:%s)" % pattern for pattern in patterns)
+
+
+def _pattern_stage(patterns, flags=0, literals=None):
+    """
+    If given, ``literals`` must include a substring of every possible match of the patterns. Searching for
+    literals is much faster than for patterns starting with ``\\b``, which the regex engine tries at every position.
+    """
+    compiled = [re.compile(pattern, flags) for pattern in patterns]
+    guard = _alternation(patterns) if literals is None else _alternation(map(re.escape, literals))
+    return guard, flags, [partial(regex.sub, " ") for regex in compiled]
+
+
+def _word_stage(words):
+    """
+    Single characters are all replaced first, in one ``str.translate``. This is only equivalent to replacing the
+    words in their original order if no longer word before them could be created or broken by doing so.
+    """
+    chars = [word for word in words if len(word) == 1]
+    last_char = max(i for i, word in enumerate(words) if len(word) == 1)
+    assert not any(c in word for word in words[:last_char] if len(word) > 1 for c in chars + [" "]), words
+    steps = [methodcaller("translate", str.maketrans(dict.fromkeys(chars, " ")))] + \
+            [methodcaller("replace", word, " ") for word in words if len(word) > 1]
+    return _alternation(map(re.escape, words)), 0, steps
+
+
+DELETE_PATTERN1_LITERALS = (":/", ".jpg", ".png", ".JPG", ".PNG", ".html", "d=", " points)")
+DELETE_PATTERN3_LITERALS = ("Powered by", ".onion", "File:", "./ucp")
+
+DELETE_ROW_REGEX = re.compile(_alternation(DELETE_ROW_PATTERNS))
+# Each stage is a combined guard pattern, which matches whenever one of the stage's steps could change the text,
+# and those steps, to be applied in order
+DELETE_STAGES = [(re.compile(guard, flags), steps) for guard, flags, steps in (
+    _pattern_stage(DELETE_PATTERN1, literals=DELETE_PATTERN1_LITERALS),
+    _word_stage(DELETE_WORD1),
+    _pattern_stage(DELETE_PATTERN_IGNORECASE, re.IGNORECASE),
+    _pattern_stage(DELETE_PATTERN2),
+    _word_stage(DELETE_WORD2),
+    _pattern_stage(DELETE_PATTERN3, literals=DELETE_PATTERN3_LITERALS),
+)]
+DASHES_REGEX = re.compile(r'--+')
+DOTS_REGEX = re.compile(r'(\.\s*\.)+')
+
+
 def clean(text):
-    for pattern in DELETE_ROW_PATTERNS:
-        if re.search(pattern, text):
-            return ""
+    if DELETE_ROW_REGEX.search(text):
+        return ""
     # remove non-ascii characters
     # text = ''.join(char for char in text if ord(char) < 128)
-    for pattern in DELETE_PATTERN1:
-        text = re.sub(pattern, ' ', text)
-    for word in DELETE_WORD1:
-        text = text.replace(word, ' ')
-    for pattern in DELETE_PATTERN_IGNORECASE:
-        text = re.sub(pattern, ' ', text, flags=re.IGNORECASE)
-    for pattern in DELETE_PATTERN2:
-        text = re.sub(pattern, ' ', text)
-    for word in DELETE_WORD2:
-        text = text.replace(word, ' ')
-    for pattern in DELETE_PATTERN3:
-        text = re.sub(pattern, ' ', text)
-
-    # remove consecutive spaces
-    text = re.sub(r'[\s=]+', ' ', text)
-    text = re.sub(r'--+', '--', text)
-    text = re.sub(r'(\.\s*\.)+', '..', text)
+    for guard, steps in DELETE_STAGES:
+        if guard.search(text):
+            for step in steps:
+                text = step(text)
+
+    # remove consecutive spaces (and equal signs), leaving out leading and trailing ones, which are stripped anyway
+    text = " ".join(text.replace("=", " ").split())
+    text = DASHES_REGEX.sub('--', text)
+    text = DOTS_REGEX.sub('..', text)
 
     return text.strip()
 
@@ -96,32 +144,106 @@ def clean_lines(all_lines):
                 yield line
 
 
-@contextlib.contextmanager
-def dummy():
-    yield None
-
-
 def detect_duplicates(s):
-    return re.sub(r"\d", "", s.lower())
-
-
-def clean_directory(dirname, print_files=True):
-    output = []
+    return DIGIT_REGEX.sub("", s.lower())
+
+
+def clean_file(path):
+    """
+    Yields the clean lines of a raw document file, skipping consecutive duplicates.
+    """
+    for _, lines in groupby(clean_lines(read_file(path)), key=detect_duplicates):
+        yield next(lines)
+
+
+def _clean_file_to_list(path):
+    return list(clean_file(path)), os.path.getsize(path)
+
+
+def _clean_file_to_file(paths):
+    in_path, out_path = paths
+    with open(out_path, "w", encoding="utf-8") as f_out:
+        for line in clean_file(in_path):
+            print(line, file=f_out)
+    return None, os.path.getsize(in_path)
+
+
+class Progress:
+    """
+    Prints the number of processed files and the throughput in files/sec and MB/sec to stderr,
+    at most once every ``interval`` seconds, and once more when done.
+    """
+    def __init__(self, total, interval=5.0):
+        self.total = total
+        self.interval = interval
+        self.files = self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, num_bytes):
+        self.files += 1
+        self.bytes += num_bytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval or self.files == self.total:
+            self.last = now
+            elapsed = max(now - self.start, 1e-9)
+            print("Cleaned %d/%d files (%.1f files/sec, %.2f MB/sec)" % (
+                self.files, self.total, self.files / elapsed, self.bytes / elapsed / 1e6), file=sys.stderr)
+
+
+def map_files(func, args, processes=None, ordered=True):
+    """
+    Maps ``func`` over ``args`` (e.g., file paths) in ``processes`` worker processes (default: one per CPU), or in
+    this process if ``processes`` is 1, yielding the results in order unless ``ordered`` is False.
+    """
+    if processes == 1:
+        yield from map(func, args)
+    else:
+        with Pool(processes) as pool:
+            yield from (pool.imap if ordered else pool.imap_unordered)(func, args)
+
+
+def iter_clean_directory(dirname, processes=None, progress=True):
+    """
+    Yields the clean lines of all files in a directory, file by file in ``os.listdir`` order.
+    Files are cleaned in parallel by ``processes`` worker processes (default: one per CPU).
+    """
+    paths = [os.path.join(dirname, filename) for filename in os.listdir(dirname)]
+    report = Progress(len(paths)) if progress else None
+    for lines, num_bytes in map_files(_clean_file_to_list, paths, processes):
+        yield from lines
+        if report:
+            report.update(num_bytes)
+
+
+def clean_directory(dirname, print_files=True, processes=None, progress=True):
+    """
+    Cleans all files in a directory using ``processes`` worker processes (default: one per CPU).
+    If ``print_files``, each file is written with the same name to the directory ``dirname + "_clean"``;
+    otherwise, a list of all clean lines is returned, file by file in ``os.listdir`` order.
+    """
+    if not print_files:
+        return list(iter_clean_directory(dirname, processes=processes, progress=progress))
     out_dir = dirname + "_clean"
-    if print_files:
-        os.makedirs(out_dir, exist_ok=True)
-    for filename in os.listdir(dirname):
-        with open(os.path.join(out_dir, filename), 'w', encoding="utf-8") if print_files else dummy() as f_out:
-            # remove duplicate lines
-            for _, lines in groupby(clean_lines(read_file(os.path.join(dirname, filename))), key=detect_duplicates):
-                for line in lines:
-                    if print_files:
-                        print(line, file=f_out)
-                    else:
-                        output.append(line)
-                    break
-    return None if print_files else output
+    os.makedirs(out_dir, exist_ok=True)
+    filenames = os.listdir(dirname)
+    report = Progress(len(filenames)) if progress else None
+    for _, num_bytes in map_files(_clean_file_to_file,
+                                  [(os.path.join(dirname, filename), os.path.join(out_dir, filename))
+                                   for filename in filenames], processes, ordered=False):
+        if report:
+            report.update(num_bytes)
+    return None
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Clean raw document files, writing each directory's files "
+                                                    "to a directory of the same name with a '_clean' suffix.")
+    argparser.add_argument("dirs", nargs="*", default=[os.getcwd()], help="directories to clean (default: current)")
+    argparser.add_argument("-p", "--processes", type=int, help="number of worker processes (default: one per CPU)")
+    args = argparser.parse_args()
+    for dirname in args.dirs:
+        clean_directory(dirname.rstrip(os.sep), processes=args.processes)
 
 
 if __name__ == "__main__":
-    clean_directory(os.getcwd())
+    main()
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+from hashlib import blake2b
+
+import numpy as np
+
+from cyber.util.clean_text import detect_duplicates
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def hash64(s):
+    """
+    A stable (unlike ``hash``) signed 64-bit hash of a string.
+    """
+    return int.from_bytes(blake2b(s.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def lsh_parameters(threshold, num_permutations):
+    """
+    Returns the number of bands and rows per band, using at most ``num_permutations`` MinHash values, such that
+    two documents whose Jaccard similarity is ``threshold`` have a probability of about 1/2 to share a band.
+    """
+    return min(((num_permutations // rows, rows) for rows in range(1, num_permutations + 1)),
+               key=lambda b_r: abs((1 / b_r[0]) ** (1 / b_r[1]) - threshold))
+
+
+class HashStore:
+    """
+    A set of ``(band, hash)`` pairs, kept in memory or, if ``path`` is given, in an SQLite database on disk.
+    The set always starts empty: hashes left in the database by an earlier run are dropped.
+    """
+    def __init__(self, num_bands=1, path=None, commit_every=10000):
+        self.path = path
+        if path is None:
+            self.bands = [set() for _ in range(num_bands)]
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("DROP TABLE IF EXISTS hashes")
+            self.connection.execute("CREATE TABLE hashes (band INTEGER, hash INTEGER, "
+                                    "PRIMARY KEY (band, hash)) WITHOUT ROWID")
+            self.commit_every = commit_every
+            self.uncommitted = 0
+
+    def add(self, band, value):
+        """
+        Adds a hash to the band, returning whether it was already there.
+        """
+        if self.path is None:
+            seen = self.bands[band]
+            if value in seen:
+                return True
+            seen.add(value)
+            return False
+        inserted = self.connection.execute("INSERT OR IGNORE INTO hashes VALUES (?, ?)", (band, value)).rowcount
+        self.uncommitted += inserted
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+        return not inserted
+
+    def close(self):
+        if self.path is not None:
+            self.connection.commit()
+            self.connection.close()
+
+
+class Deduplicator:
+    """
+    Detects lines that duplicate an earlier line, keeping only fixed-size hashes of what it has seen.
+
+    By default, a line is a duplicate if it is the same as an earlier one up to case and digits (see
+    ``detect_duplicates``), and only a 64-bit hash of this key is kept.
+    If ``threshold`` is given, near-duplicates are detected instead, by locality-sensitive hashing of the MinHash
+    signature of the key's word ``shingle_size``-grams: a line is a duplicate if it shares a band with an earlier
+    line, which is likely when their Jaccard similarity is above ``threshold``.
+    If ``path`` is given, hashes are stored in an SQLite database there instead of in memory, replacing any left
+    there by an earlier run.
+    """
+    def __init__(self, threshold=None, num_permutations=128, shingle_size=3, path=None, seed=0):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        if threshold is None:
+            self.num_bands, self.rows = 1, 0
+        else:
+            self.num_bands, self.rows = lsh_parameters(threshold, num_permutations)
+            rng = np.random.RandomState(seed)
+            self.a = rng.randint(1, 1 << 32, size=self.num_bands * self.rows, dtype=np.uint64)
+            self.b = rng.randint(0, 1 << 32, size=self.num_bands * self.rows, dtype=np.uint64)
+        self.store = HashStore(self.num_bands, path)
+
+    def minhash(self, key):
+        words = key.split()
+        shingles = {" ".join(words[i:i + self.shingle_size])
+                    for i in range(max(1, len(words) - self.shingle_size + 1))}
+        hashes = np.array([hash64(shingle) & 0xFFFFFFFF for shingle in shingles], dtype=np.uint64)
+        # (a * x + b) fits in 64 bits since a, b and x are all below 2^32
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+    def is_duplicate(self, line):
+        """
+        Returns whether the line duplicates one seen before, and remembers it.
+        """
+        key = detect_duplicates(line)
+        if self.threshold is None:
+            return self.store.add(0, hash64(key))
+        bands = self.minhash(key).reshape(self.num_bands, self.rows)
+        duplicate = False
+        for band, values in enumerate(bands):
+            duplicate |= self.store.add(band, hash64(values.tobytes().hex()))
+        return duplicate
+
+    def close(self):
+        self.store.close()
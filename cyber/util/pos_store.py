@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from array import array
+from collections import Counter
+from functools import partial
+from itertools import islice
+
+import numpy as np
+import spacy
+from spacy.attrs import POS
+from spacy.parts_of_speech import NAMES as POS_NAMES
+
+from cyber.util.clean_text import map_files
+
+# Part of the stored content hash, so that annotations stored in an earlier format are tagged again
+ANNOTATION_FORMAT = b"unstripped lines\n"
+
+_nlp = None
+
+
+def get_nlp():
+    """
+    Loads spaCy on first use, without the parser and named entity recognizer, which POS tagging does not need.
+    """
+    global _nlp  # pylint: disable=global-statement
+    if _nlp is None:
+        _nlp = spacy.load("en", disable=["parser", "ner"])
+    return _nlp
+
+
+class PosAnnotations:
+    """
+    The tokens (as ``text_with_ws``) and POS tag ids of a file's documents, kept as arrays: ``vocab`` holds the
+    distinct token strings, ``ids`` the vocabulary index of every token, ``pos`` its POS tag id, and ``offsets``
+    the index of every document's first token (and the total number of tokens last). Each line is tagged as it is
+    in the file, so a document's tokens include the whitespace at its start and end, with the newline.
+    """
+    def __init__(self, vocab, ids, pos, offsets):
+        self.vocab = vocab
+        self.ids = ids
+        self.pos = pos
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """
+        Yields the list of token strings and the array of POS tag ids of every document.
+        """
+        for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist()):
+            yield [self.vocab[i] for i in self.ids[start:end].tolist()], self.pos[start:end]
+
+    def pos_histogram(self):
+        """
+        Returns the number of tokens with each POS tag, whitespace included, as tagging every line of the file does.
+        """
+        return Counter({POS_NAMES[pos]: count for pos, count in enumerate(np.bincount(self.pos).tolist()) if count})
+
+    def save(self, path, content_hash):
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            np.savez(f, ids=self.ids, pos=self.pos, offsets=self.offsets, content_hash=np.array(content_hash),
+                     vocab=np.frombuffer(json.dumps(self.vocab).encode("utf-8"), dtype=np.uint8))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, content_hash=None):
+        """
+        Returns the annotations saved in ``path``, or None if there are none or they are of different content.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as arrays:
+            if content_hash is not None and str(arrays["content_hash"]) != content_hash:
+                return None
+            return cls(json.loads(arrays["vocab"].tobytes().decode("utf-8")), arrays["ids"], arrays["pos"],
+                       arrays["offsets"])
+
+
+def tag_lines(lines, batch_size=1000):
+    """
+    Returns the token strings and POS tag ids of each line, tagged by spaCy.
+    """
+    return [([token.text_with_ws for token in doc], doc.to_array(POS).astype(np.uint16))
+            for doc in get_nlp().pipe(lines, batch_size=batch_size)]
+
+
+def chunks(lines, size):
+    """
+    Yields lists of ``size`` consecutive lines (the last one possibly shorter).
+    """
+    lines = iter(lines)
+    return iter(lambda: list(islice(lines, size)), [])
+
+
+def annotation_path(file_path, directory=None):
+    return os.path.join(directory or os.path.dirname(file_path), os.path.basename(file_path) + ".pos.npz")
+
+
+def annotate_file(file_path, directory=None, processes=None, batch_size=1000):
+    """
+    Returns the POS annotations of the documents in a file, one per line (not stripped). They are stored in
+    ``annotation_path(file_path, directory)`` along with the SHA-1 of the file (and ``ANNOTATION_FORMAT``), and
+    only tagged again if the file changes (delete the stored annotations to tag again with a different spaCy
+    model). Tagging is done in chunks
+    of ``batch_size`` by ``processes`` worker processes (default: one per CPU), which fork after spaCy is loaded.
+    """
+    with open(file_path, "rb") as f:
+        content_hash = hashlib.sha1(ANNOTATION_FORMAT + f.read()).hexdigest()
+    path = annotation_path(file_path, directory)
+    annotations = PosAnnotations.load(path, content_hash)
+    if annotations is not None:
+        return annotations
+    get_nlp()
+    vocab = {}
+    ids = array("i")
+    pos = array("H")
+    offsets = array("q", [0])
+    with open(file_path, encoding="utf-8") as f:
+        for chunk in map_files(partial(tag_lines, batch_size=batch_size), chunks(f, batch_size), processes):
+            for texts, doc_pos in chunk:
+                ids.extend(vocab.setdefault(text, len(vocab)) for text in texts)
+                pos.extend(doc_pos.tolist())
+                offsets.append(len(ids))
+    annotations = PosAnnotations(list(vocab), np.frombuffer(ids, dtype=np.int32),
+                                 np.frombuffer(pos, dtype=np.uint16), np.frombuffer(offsets, dtype=np.int64))
+    annotations.save(path, content_hash)
+    return annotations
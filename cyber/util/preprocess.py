@@ -1,14 +1,26 @@
+import argparse
 import os
+from itertools import compress
 
-import spacy
+import numpy as np
+from spacy.attrs import POS
+from spacy.parts_of_speech import NAMES as POS_NAMES
 from spacy.symbols import ADJ, ADV, NOUN, PROPN, VERB, X, NUM
 
+from cyber.util.pos_store import annotate_file, tag_lines
 from cyber.util.split_data import DATA_SUBDIRS, clean_file_path
 
-nlp = spacy.load("en")
-
 CONTENT_POS = {ADJ, ADV, NOUN, PROPN, VERB, X, NUM}
+CONTENT_POS_IDS = np.array(sorted(CONTENT_POS), dtype=np.uint64)
 
+# Output file suffix and ``mask`` arguments of each variant
+VARIANTS = (
+    ("dropcontent", dict(drop=True, content=True)),
+    ("poscontent", dict(drop=False, content=True)),
+    ("dropfunc", dict(drop=True, func=True)),
+    ("posfunc", dict(drop=False, func=True)),
+    ("pos", dict(drop=False, content=True, func=True)),
+)
 
 def mask(tok, drop=False, content=False, func=False):
     assert not (drop and content and func), "Cannot drop all tokens"
@@ -22,26 +34,84 @@ def mask(tok, drop=False, content=False, func=False):
         return tok.text_with_ws
 
 
-def print_doc(file, **kwargs):
-    s = "".join(mask(t, **kwargs) for t in doc)
-    if s:
-        print(" ".join(s.split()).strip(), file=file)
+def mask_doc(doc):
+    return mask_tokens([token.text_with_ws for token in doc], doc.to_array(POS))
 
 
-if __name__ == "__main__":
+def mask_tokens(texts, pos):
+    """
+    Returns the text of a document, given by its tokens' ``text_with_ws`` and POS tag ids, masked as in each of
+    the ``VARIANTS``, with consecutive whitespace collapsed, or None for variants where no token is left (so
+    nothing should be printed). This is the same as joining ``mask`` of every token for each variant, but which
+    tokens to mask is computed on the array of POS tags.
+    """
+    is_content = np.isin(pos, CONTENT_POS_IDS)
+    pos_texts = None
+    variants = []
+    for _, kwargs in VARIANTS:
+        masked = np.zeros_like(is_content)
+        if kwargs.get("content"):
+            masked |= is_content
+        if kwargs.get("func"):
+            masked |= ~is_content
+        if kwargs["drop"]:
+            s = "".join(compress(texts, (~masked).tolist()))
+        else:
+            if pos_texts is None:
+                pos_texts = [" " + POS_NAMES[p] + " " for p in pos.tolist()]
+            s = "".join(pos_text if m else text for text, pos_text, m in zip(texts, pos_texts, masked.tolist()))
+        variants.append(" ".join(s.split()) if s else None)
+    return variants
+
+
+def strip_tokens(texts, pos):
+    """
+    Removes the whitespace tokens at the start and end of a document, which tagging the stripped line would not
+    have produced.
+    """
+    start, end = 0, len(texts)
+    while start < end and texts[start].isspace():
+        start += 1
+    while end > start and texts[end - 1].isspace():
+        end -= 1
+    return texts[start:end], pos[start:end]
+
+
+def mask_lines(lines, batch_size=1000):
+    return [mask_tokens(texts, pos) for texts, pos in tag_lines(lines, batch_size=batch_size)]
+
+
+def preprocess_file(file_path, processes=None, batch_size=1000, annotation_directory=None):
+    """
+    Writes each masked variant of the documents in a file (one per line) to a file with the variant name
+    before the extension. The documents are tagged once and stored by ``annotate_file`` (in
+    ``annotation_directory``, by default next to the file), so that they are only masked when run again.
+    """
+    annotations = annotate_file(file_path, annotation_directory, processes=processes, batch_size=batch_size)
+    splitext = os.path.splitext(file_path)
+    outputs = [open(splitext[0] + "." + name + splitext[1], "w", encoding="utf-8") for name, _ in VARIANTS]
+    try:
+        for texts, pos in annotations:
+            for output, text in zip(outputs, mask_tokens(*strip_tokens(texts, pos))):
+                if text is not None:
+                    print(text, file=output)
+    finally:
+        for output in outputs:
+            output.close()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Write the POS-masked variants (%s) of the split data files." %
+                                                    ", ".join(name for name, _ in VARIANTS))
+    argparser.add_argument("-p", "--processes", type=int, help="number of tagging processes (default: one per CPU)")
+    argparser.add_argument("--batch-size", type=int, default=1000, help="documents per spaCy batch and worker task")
+    argparser.add_argument("--annotation-dir", help="where to store the POS annotations (default: next to each file)")
+    args = argparser.parse_args()
     for subdir in DATA_SUBDIRS:
         for div in ("train", "validation", "test"):
-            file_path = clean_file_path(subdir, div)
-            splitext = os.path.splitext(file_path)
-            with open(file_path, encoding="utf-8") as f, \
-                    open(splitext[0] + ".dropcontent" + splitext[1], "w", encoding="utf-8") as dropcontent, \
-                    open(splitext[0] + ".poscontent" + splitext[1], "w", encoding="utf-8") as poscontent, \
-                    open(splitext[0] + ".dropfunc" + splitext[1], "w", encoding="utf-8") as dropfunc, \
-                    open(splitext[0] + ".posfunc" + splitext[1], "w", encoding="utf-8") as posfunc, \
-                    open(splitext[0] + ".pos" + splitext[1], "w", encoding="utf-8") as pos:
-                for doc in nlp.pipe(map(str.strip, f)):
-                    print_doc(dropcontent, drop=True,  content=True)
-                    print_doc(poscontent,  drop=False, content=True)
-                    print_doc(dropfunc,    drop=True,  func=True)
-                    print_doc(posfunc,     drop=False, func=True)
-                    print_doc(pos,         drop=False, content=True, func=True)
+            preprocess_file(clean_file_path(subdir, div), processes=args.processes, batch_size=args.batch_size,
+                            annotation_directory=args.annotation_dir)
+
+
+if __name__ == "__main__":
+    main()
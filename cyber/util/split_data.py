@@ -1,10 +1,14 @@
+import argparse
 import os
+import tempfile
 from collections import Counter
+from itertools import islice
 from random import sample, seed
 
 import numpy as np
 
-from cyber.util.clean_text import clean_directory, detect_duplicates
+from cyber.util.clean_text import iter_clean_directory
+from cyber.util.dedup import Deduplicator, hash64
 
 # sys.path.append("/cs/snapless/oabend/borgr/cyber")
 
@@ -27,46 +31,90 @@ def clean_file_path(subdir, div):
     return os.path.join(DATA_DIR, div, "_".join(subdir) + ".txt")
 
 
-def get_clean_lines(subdir):
-    lines_set = set()
-    lines = []
-    deleted = Counter()
-    for l in clean_directory(os.path.join(DATA_DIR, "raw", *subdir), print_files=False):
-        key = detect_duplicates(l)
-        if len(l) <= MAX_LENGTH and key not in lines_set:
-            lines.append(l)
-            lines_set.add(key)
+def get_clean_lines(subdir, threshold=None, spill_dir=None, processes=None):
+    """
+    Yields the clean lines of a subdirectory, without lines that are too long or duplicate an earlier line.
+    Duplicates are detected by ``Deduplicator``: exact (up to case and digits) by default, or near-duplicates
+    with Jaccard similarity above ``threshold`` if given. If ``spill_dir`` is given, the hashes of seen lines are
+    kept in an SQLite database there rather than in memory.
+    """
+    dedup = Deduplicator(threshold, path=None if spill_dir is None else os.path.join(spill_dir,
+                                                                                     "_".join(subdir) + ".sqlite"))
+    deleted = Counter()  # by line hash, for the duplicity histogram
+    for l in iter_clean_directory(os.path.join(DATA_DIR, "raw", *subdir), processes=processes):
+        if len(l) <= MAX_LENGTH and not dedup.is_duplicate(l):
+            yield l
         else:
-            deleted.update([l])
+            deleted[hash64(l)] += 1
+    dedup.close()
     print("%s: %d filtered duplicates, duplicity histogram: %s" % (
         os.path.join(*subdir), len(deleted), sorted(Counter(deleted.values()).items())))
-    return lines
-
-
-def split_data(subdirs):
-    clean = {subdir: get_clean_lines(subdir) for subdir in subdirs}
-    min_num = min(map(len, clean.values()))
-    train = int(TRAIN_RATIO * min_num)
-    validation = train + int(VALIDATION_RATIO * min_num)
-    for subdir, lines in clean.items():
-        print("%s: sampling %d out of %d instances" % ("_".join(subdir), min_num, len(lines)))
-        line_nums = sorted(sample(list(range(len(lines))), min_num))
-        lines = np.array(lines)[line_nums]
-        len_hist = Counter()
-        for div, start, end in ("train", 0, train), ("validation", train, validation), ("test", validation, min_num):
-            file_path = clean_file_path(subdir, div)
-            with open(file_path, "w", encoding="utf-8") as f:
-                for line in lines[start:end]:
-                    len_hist[len(line)] += 1
-                    print(line[:MAX_LENGTH], file=f)
-            print("Created '%s' with %d lines, %d lines exceed maximum length, mean length in characters: %.1f, "
-                  "maximum observed length: %d" % (file_path, end - start + 1,
-                                                   len([l for l in len_hist.elements() if l > MAX_LENGTH]),
-                                                   np.mean(list(len_hist.elements())).item(),
-                                                   max(len_hist.elements())))
 
 
-if __name__ == "__main__":
+def _select(lines, line_nums):
+    """
+    Yields the lines whose (0-based) indices are in ``line_nums``, which must be sorted.
+    """
+    line_nums = iter(line_nums)
+    next_num = next(line_nums, None)
+    for line_num, line in enumerate(lines):
+        if line_num == next_num:
+            yield line.rstrip("\n")
+            next_num = next(line_nums, None)
+            if next_num is None:
+                return
+
+
+def split_data(subdirs, threshold=None, spill_dir=None, processes=None):
+    """
+    Two passes over the data, so that the corpus is never held in memory: the first writes the clean lines of each
+    subdirectory to a temporary file and counts them, and the second samples the same number of lines from each by
+    index, and writes them to the train, validation and test files.
+    """
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmp_dir:
+        num_lines = {}
+        for subdir in subdirs:
+            with open(os.path.join(tmp_dir, "_".join(subdir)), "w", encoding="utf-8") as f:
+                num_lines[subdir] = 0
+                for line in get_clean_lines(subdir, threshold, spill_dir, processes):
+                    print(line, file=f)
+                    num_lines[subdir] += 1
+        min_num = min(num_lines.values())
+        train = int(TRAIN_RATIO * min_num)
+        validation = train + int(VALIDATION_RATIO * min_num)
+        for subdir, num in num_lines.items():
+            print("%s: sampling %d out of %d instances" % ("_".join(subdir), min_num, num))
+            line_nums = sorted(sample(range(num), min_num))
+            len_hist = Counter()
+            with open(os.path.join(tmp_dir, "_".join(subdir)), encoding="utf-8") as f_in:
+                sampled = _select(f_in, line_nums)
+                for div, start, end in ("train", 0, train), ("validation", train, validation), \
+                                       ("test", validation, min_num):
+                    file_path = clean_file_path(subdir, div)
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        for line in islice(sampled, end - start):
+                            len_hist[len(line)] += 1
+                            print(line[:MAX_LENGTH], file=f)
+                    print("Created '%s' with %d lines, %d lines exceed maximum length, mean length in characters: "
+                          "%.1f, maximum observed length: %d" % (
+                              file_path, end - start + 1, sum(n for l, n in len_hist.items() if l > MAX_LENGTH),
+                              sum(l * n for l, n in len_hist.items()) / sum(len_hist.values()), max(len_hist)))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Clean, deduplicate and split the raw data into train, "
+                                                    "validation and test sets of equal size per subdirectory.")
+    argparser.add_argument("--threshold", type=float,
+                           help="remove near-duplicates with at least this estimated Jaccard similarity "
+                                "(default: only remove exact duplicates, up to case and digits)")
+    argparser.add_argument("--spill-dir", help="keep the hashes of seen lines in SQLite databases in this directory "
+                                               "instead of in memory")
+    argparser.add_argument("-p", "--processes", type=int, help="number of cleaning processes (default: one per CPU)")
+    args = argparser.parse_args()
     np.random.seed(0)
     seed(0)
-    split_data(DATA_SUBDIRS)
+    split_data(DATA_SUBDIRS, threshold=args.threshold, spill_dir=args.spill_dir, processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 #!/usr/bin/env bash
 
 trap 'kill $(jobs -p)' EXIT  # Kill server on exit
-python -m allennlp.service.server_simple \
+# Concurrent requests are batched together; see python -m benchmarks.server_load
+python -m cyber.predictors.micro_batching \
     --archive-path models/drugs_bcn_with_cuda_0/model.tar.gz \
     --predictor attention_classifier \
     --include-package cyber \
-    --title "Cyber Classification Demo" \
-    --field-name text_input \
+    --max-batch-size 32 \
+    --max-wait 0.01 \
     --port 8001 &
 cd demo
 #npm install
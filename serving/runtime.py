@@ -0,0 +1,95 @@
+"""
+Classify documents with a model exported by ``cyber.predictors.export``, importing only PyTorch and spaCy (and
+Flask to serve it), not AllenNLP or ``cyber``.
+
+Usage: python -m serving.runtime EXPORT_DIR [--port 8001]
+
+``POST /predict`` takes the same input JSON as ``allennlp.service.server_simple``, ``{"text_input": ...}``, but
+returns only what the ``attention_classifier_light`` predictor does: the label, the class probabilities and all
+labels. Unlike ``server.sh`` with the ``attention_classifier`` predictor, it returns no tokens or attention weights,
+so the attention visualization of the demo does not work with it. Requires PyTorch 1.2 or later.
+"""
+import argparse
+import json
+import os
+import threading
+from typing import Dict, List
+
+import spacy
+import torch
+
+
+class ExportedClassifier:
+    """
+    Tokenizes documents with spaCy, indexes the tokens with the exported vocabulary and runs the exported
+    TorchScript module on them.
+
+    Parameters
+    ----------
+    directory : ``str``, required
+        The output directory of ``cyber.predictors.export``.
+    """
+    def __init__(self, directory: str) -> None:
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            settings = json.load(f)
+        self.labels: List[str] = settings["labels"]
+        self._lowercase_tokens = settings["lowercase_tokens"]
+        self._oov_index = settings["oov_index"]
+        self._token_to_index = {token: i for i, token in enumerate(settings["tokens"])}
+        self._nlp = spacy.load(settings["spacy_model"], disable=["tagger", "parser", "ner"])
+        self._module = torch.jit.load(os.path.join(directory, "model.pt"), map_location="cpu")
+        self._module.eval()
+
+    def tokenize(self, texts: List[str]) -> List[List[str]]:
+        """
+        Splits each text into tokens as the dataset reader does (spaCy, without whitespace tokens).
+        """
+        return [[token.text for token in doc if not token.is_space] for doc in self._nlp.tokenizer.pipe(texts)]
+
+    def index(self, tokens: List[List[str]]) -> torch.Tensor:
+        """
+        Returns the padded ``(batch_size, num_tokens)`` tensor of vocabulary indices of the tokens.
+        """
+        token_ids = torch.zeros(len(tokens), max(1, max(map(len, tokens), default=0)), dtype=torch.long)
+        for i, document in enumerate(tokens):
+            if self._lowercase_tokens:
+                document = [token.lower() for token in document]
+            token_ids[i, :len(document)] = torch.tensor([self._token_to_index.get(token, self._oov_index)
+                                                        for token in document], dtype=torch.long)
+        return token_ids
+
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        with torch.no_grad():
+            class_probabilities = self._module(self.index(self.tokenize(texts)))
+        return [{"label": self.labels[int(probabilities.argmax())],
+                 "class_probabilities": probabilities.tolist(),
+                 "all_labels": self.labels} for probabilities in class_probabilities]
+
+    def predict(self, text: str) -> Dict:
+        return self.predict_batch([text])[0]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("directory", help="output directory of cyber.predictors.export")
+    argparser.add_argument("--port", type=int, default=8001)
+    args = argparser.parse_args()
+    from flask import Flask, jsonify, request
+    from flask_cors import CORS
+    classifier = ExportedClassifier(args.directory)
+    lock = threading.Lock()
+    app = Flask(__name__)  # pylint: disable=invalid-name
+    CORS(app)
+
+    @app.route("/predict", methods=["POST", "OPTIONS"])
+    def predict():  # pylint: disable=unused-variable
+        if request.method == "OPTIONS":
+            return "", 200
+        with lock:
+            return jsonify(classifier.predict(request.get_json()["text_input"]))
+
+    app.run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()